@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite for the VaR vs ES pipeline stages, running offline on
+synthetic market data. Each stage is timed (wall clock) and its peak memory
+measured across scaling grids of days, portfolios and window sizes; results
+are written to JSON so that they can be compared across commits.
+
+usage:
+    python benchmark.py --output bench.json [--backend auto|numba|numpy]
+    python benchmark.py --quick --compare bench.json
+"""
+
+####################################
+#            LIBRARIES
+####################################
+
+import pandas as pd
+import numpy as np
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+import var_vs_es
+
+####################################
+#             CONSTANTS
+####################################
+
+# base configuration (days, portfolios, window); each grid varies one
+# dimension around it
+BASE = {'days': 7500, 'portfolios': 100, 'window': 500}
+GRIDS = {
+        'days': [1000, 5000, 10000, 50000],
+        'portfolios': [10, 100, 1000, 5000],
+        'window': [250, 500, 1000, 2000]
+}
+QUICK_BASE = {'days': 2000, 'portfolios': 20, 'window': 250}
+QUICK_GRIDS = {
+        'days': [1000, 2000, 5000],
+        'portfolios': [10, 50, 100],
+        'window': [250, 500]
+}
+
+####################################
+#        FUNCTIONS / CLASSES
+####################################
+
+
+def synthetic_market_data(days=7500, tickers=30, index='^DJI', mu=0.07,
+                          sigma=0.2, beta=(0.5, 1.5), idio_sigma=0.2,
+                          jump_intensity=0.5, jump_mean=-0.05, jump_std=0.08,
+                          late_listing=0.2, gaps=0.0, seed=0,
+                          start='1989-02-01'):
+    """Creates DataFrame structure with synthetic market data (Adjusted
+    Close) for an index and its constituents. Index prices follow a
+    geometric Brownian motion with (Poisson) jumps; constituents follow the
+    index with random betas, plus idiosyncratic diffusion and jumps
+    ---------------------------------------------------------------------------
+    inputs:
+        days: number of sessions
+        tickers: number of constituents
+        index: ticker of the index
+        mu: annual drift of the index
+        sigma: annual volatility of the index
+        beta: range (min, max) of the constituents' betas
+        idio_sigma: annual idiosyncratic volatility of the constituents
+        jump_intensity: expected number of jumps per year for each series
+        jump_mean: average jump size (logN)
+        jump_std: standard deviation of jump sizes (logN)
+        late_listing: share of constituents whose history starts after the
+        first session (missing values before listing)
+        gaps: probability of a missing value on any other session
+        seed: seed for the random number generator
+        start: first session
+    outputs:
+        DataFrame structure (sessions x [index] + constituents) with prices
+    ---------------------------------------------------------------------------
+    """
+    rng = np.random.default_rng(seed)
+    dt = 1 / 252
+
+    def jumps(shape):
+        counts = rng.poisson(jump_intensity * dt, shape)
+        return counts * jump_mean + np.sqrt(counts) * jump_std * (
+                rng.standard_normal(shape)
+        )
+
+    market = (
+            (mu - sigma**2 / 2) * dt
+            + sigma * np.sqrt(dt) * rng.standard_normal(days)
+            + jumps(days)
+    )
+    betas = rng.uniform(beta[0], beta[1], tickers)
+    returns = (
+            market[:, np.newaxis] * betas
+            - idio_sigma**2 / 2 * dt
+            + idio_sigma * np.sqrt(dt) * rng.standard_normal((days, tickers))
+            + jumps((days, tickers))
+    )
+    prices = 100 * np.exp(np.cumsum(
+            np.concatenate([market[:, np.newaxis], returns], axis=1), axis=0
+    ))
+
+    # missing history patterns: late listings and random gaps
+    late = rng.random(tickers) < late_listing
+    listing = np.where(late, rng.integers(1, max(days // 2, 2), tickers), 0)
+    prices[:, 1 :][np.arange(days)[:, np.newaxis] < listing] = np.nan
+    if gaps > 0:
+        prices[:, 1 :][rng.random((days, tickers)) < gaps] = np.nan
+
+    names = ['T{0:04d}'.format(i) for i in range(tickers)]
+    return pd.DataFrame(
+            prices,
+            index=pd.bdate_range(start, periods=days),
+            columns=[index] + names
+    )
+
+
+def measure(function, *args, **kwargs):
+    """Executes function, measuring wall clock time and peak memory
+    allocated during the call
+    ---------------------------------------------------------------------------
+    outputs:
+        Tuple structure with the function's result, seconds and peak
+        memory (MB)
+    ---------------------------------------------------------------------------
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            result = function(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak / 2**20
+
+
+def run_case(pipeline, days, portfolios, window, seed=0):
+    """Runs every pipeline stage for a configuration of the grid
+    ---------------------------------------------------------------------------
+    inputs:
+        pipeline: module with the pipeline functions
+        days: number of sessions of market data
+        portfolios: number of portfolios (index portfolio included)
+        window: size of the VaR / ES and scenario windows
+        seed: seed for market data and portfolio generation
+    outputs:
+        List structure with a Dictionary of measurements for each stage
+    ---------------------------------------------------------------------------
+    """
+    data = synthetic_market_data(days + 10, seed=seed)
+    index = data.columns[0]
+    tickers = list(data.columns[1 :])
+    stages = []
+
+    def stage(name, function, *args, **kwargs):
+        result, seconds, peak = measure(function, *args, **kwargs)
+        stages.append({'stage': name,
+                       'days': days,
+                       'portfolios': portfolios,
+                       'window': window,
+                       'seconds': seconds,
+                       'peak_mb': peak
+        })
+        return result
+
+    data = stage('series_reconstructor', pipeline.series_reconstructor,
+                 data, index)
+    stage('delta_calculator', pipeline.delta_calculator, data)
+    weights = pipeline.portfolio_generator(
+            data, index, tickers, k=portfolios - 1, seed=seed
+    )
+    hist_pl = stage('pl_calculator', pipeline.pl_calculator, data, weights)
+    scenarios = stage('scenario_identificator',
+                      pipeline.scenario_identificator, hist_pl, window)
+    var, es = stage('var_es_calculator', pipeline.var_es_calculator,
+                    hist_pl, window)
+    cube = stage('backtester', pipeline.backtester,
+                 scenarios, hist_pl, var, es)
+    stage('results_summary', pipeline.results_summary, cube)
+    return stages
+
+
+def benchmark_suite(pipeline, base=BASE, grids=GRIDS, seed=0):
+    """Runs the pipeline stages over scaling grids, varying one dimension
+    at a time around the base configuration. A small configuration is run
+    first (not measured), so that one-time costs such as the compilation
+    or cache loading of the kernel backend are not included in the first
+    measurements
+    ---------------------------------------------------------------------------
+    outputs:
+        List structure with a Dictionary of measurements for each stage and
+        configuration
+    ---------------------------------------------------------------------------
+    """
+    run_case(pipeline, 600, 5, 250, seed=seed)
+    cases = []
+    for dimension, values in grids.items():
+        for value in values:
+            case = dict(base, **{dimension: value})
+            if case not in cases:
+                cases.append(case)
+    results = []
+    for case in cases:
+        print('days={days} portfolios={portfolios} window={window}'
+              .format(**case))
+        results.extend(run_case(pipeline, seed=seed, **case))
+    return results
+
+
+def compare(results, reference):
+    """Prints the ratio of each stage's time against a previous run
+    ---------------------------------------------------------------------------
+    inputs:
+        results: List structure with current measurements
+        reference: List structure with previous measurements
+    ---------------------------------------------------------------------------
+    """
+    key = lambda r: (r['stage'], r['days'], r['portfolios'], r['window'])
+    previous = {key(r): r for r in reference}
+    print()
+    print('{0:<24}{1:>8}{2:>12}{3:>8}{4:>12}{5:>8}'.format(
+            'stage', 'days', 'portfolios', 'window', 'seconds', 'ratio'
+    ))
+    for r in results:
+        if key(r) in previous:
+            ratio = r['seconds'] / max(previous[key(r)]['seconds'], 1e-9)
+            print('{0:<24}{1:>8}{2:>12}{3:>8}{4:>12.4f}{5:>8.2f}'.format(
+                    *key(r), r['seconds'], ratio
+            ))
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+                ['git', 'rev-parse', 'HEAD'],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+####################################
+#             MAIN CODE
+####################################
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--output', default='bench_output.json',
+                        help='JSON file for the results')
+    parser.add_argument('--compare', help='JSON file of a previous run')
+    parser.add_argument('--quick', action='store_true',
+                        help='small grids, for a fast check')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', choices=var_vs_es.kernel_backend.names,
+                        default='auto',
+                        help='backend of the sequential kernels')
+    args = parser.parse_args()
+
+    pipeline = var_vs_es
+    pipeline.progress_bar.enabled = False
+    pipeline.kernels.select(args.backend)
+    if args.quick:
+        results = benchmark_suite(pipeline, QUICK_BASE, QUICK_GRIDS, args.seed)
+    else:
+        results = benchmark_suite(pipeline, BASE, GRIDS, args.seed)
+
+    report = {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'backend': pipeline.kernels.resolve(),
+            'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print('Results written to {0}'.format(args.output))
+
+    if args.compare:
+        with open(args.compare) as f:
+            reference = json.load(f)
+        if reference.get('backend') != report['backend']:
+            print('Warning: kernel backend {0} compared against {1}'.format(
+                    report['backend'], reference.get('backend')
+            ))
+        compare(results, reference['results'])
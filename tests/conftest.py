@@ -0,0 +1,6 @@
+"""Test configuration: the library (var_vs_es.py) and benchmark.py are 
+modules at the repository root, imported by the tests"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,224 @@
+"""Sequential kernels (backward fill, KO streaks and ordered window updates)
+of both backends, against the vectorized NumPy implementations and the
+original loop implementations"""
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import var_vs_es
+
+
+@pytest.fixture(params=['numpy', 'numba'])
+def backend(request):
+    if request.param == 'numba':
+        pytest.importorskip('numba')
+    var_vs_es.kernels.select(request.param)
+    yield request.param
+    var_vs_es.kernels.select('auto')
+
+
+def with_backend(name, function, *args, **kwargs):
+    var_vs_es.kernels.select(name)
+    try:
+        return function(*args, **kwargs)
+    finally:
+        var_vs_es.kernels.select('auto')
+
+
+### Oracles (original loop implementations) ###
+
+
+def backfill_loop(df, reference='^DJI', references=None):
+    """Original series_reconstructor loop: each series is walked backwards,
+    dividing the last value by the reference index's factor of each missing
+    session (NaN from a missing factor until the next existing value)"""
+    references = {} if references is None else references
+    reference_tickers = set([reference] + list(references.values()))
+    df = df.copy()
+    for t in df.columns:
+        if t in reference_tickers or not df[t].isnull().any():
+            continue
+        ref_series = df[references.get(t, reference)]
+        ref_delta = (
+                np.log(ref_series) - np.log(ref_series.shift(1))
+        ).shift(-1).tolist()
+        ref = np.nan
+        reconstructed = []
+        for delt, orig in zip(ref_delta[::-1], df[t].tolist()[::-1]):
+            ref = orig if not math.isnan(orig) else ref / (1 + delt)
+            reconstructed.append(ref)
+        df[t] = reconstructed[::-1]
+    return df
+
+
+def ko_periods_loop(series):
+    """Original ko_period_calculator loop (counter of consecutive False
+    values)"""
+    val = 0
+    vector = []
+    for i in series:
+        val = val + 1 if i is False else 0
+        vector.append(val)
+    return vector
+
+
+def ordered_update_loop(ordered, old, new):
+    """Sorts each window after removing the first occurrence of the leaving
+    value and adding the new value"""
+    updated = []
+    for values, o, v in zip(ordered.tolist(), old, new):
+        values.remove(o)
+        updated.append(sorted(values + [v]))
+    return np.array(updated)
+
+
+### Data ###
+
+
+def market_data(seed=0, days=300):
+    """Index and sector index with gaps, and constituents with late
+    listings, gaps (some next to the indices' gaps), missing last values
+    and no values at all"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2010-01-01', periods=days)
+    prices = 100 * np.exp(np.cumsum(
+            rng.normal(0, 0.01, (days, 8)), axis=0
+    ))
+    df = pd.DataFrame(prices, index=dates,
+                      columns=['^DJI', 'SECTOR'] + list('ABCDEF'))
+    df.iloc[[40, 41, 200], 0] = np.nan  # index gaps
+    df.iloc[[120], 1] = np.nan  # sector index gap
+    df.iloc[: 90, 2] = np.nan  # late listing, across an index gap
+    df.iloc[[10, 11, 12, 42, 150], 3] = np.nan  # gaps
+    df.iloc[195 : 205, 4] = np.nan  # gap across an index gap
+    df.iloc[-5 :, 5] = np.nan  # no next value
+    df.iloc[: 150, 6] = np.nan  # late listing, sector index reference
+    df.iloc[:, 7] = np.nan  # no values
+    return df
+
+
+def ko_flags(seed=0, days=500, portfolios=6):
+    """Back-test flags ('True' if OK) with runs of KO days"""
+    rng = np.random.default_rng(seed)
+    flags = rng.random((days, portfolios)) > 0.1
+    flags[100 : 130, 0] = False
+    flags[: 20, 1] = False
+    flags[-15 :, 2] = False
+    flags[:, 3] = False
+    flags[:, 4] = True
+    return flags
+
+
+### Backward fill (series_reconstructor) ###
+
+
+def test_backfill(backend):
+    df = market_data()
+    references = {'F': 'SECTOR'}
+    filled = var_vs_es.series_reconstructor(df, '^DJI', references)
+    expected = backfill_loop(df, '^DJI', references)
+    pd.testing.assert_index_equal(filled.columns, df.columns)
+    np.testing.assert_array_equal(np.isnan(filled.values),
+                                  np.isnan(expected.values))
+    np.testing.assert_allclose(filled.values, expected.values, rtol=1e-12)
+    # existing values are kept, and the provided data is unchanged
+    existing = ~np.isnan(df.values)
+    np.testing.assert_array_equal(filled.values[existing],
+                                  df.values[existing])
+    pd.testing.assert_frame_equal(df, market_data())
+
+
+def test_backfill_backends():
+    pytest.importorskip('numba')
+    df = market_data(seed=1)
+    pd.testing.assert_frame_equal(
+            with_backend('numba', var_vs_es.series_reconstructor, df),
+            with_backend('numpy', var_vs_es.series_reconstructor, df),
+            check_exact=True
+    )
+
+
+### KO streaks (ko_period_calculator) ###
+
+
+def test_ko_periods(backend):
+    flags = ko_flags()
+    periods = var_vs_es.ko_period_calculator(flags)
+    assert periods.shape == flags.shape
+    for j in range(flags.shape[1]):
+        assert periods[:, j].tolist() == ko_periods_loop(flags[:, j].tolist())
+    # vectors and non-boolean values (only False values are KO days)
+    series = pd.Series([False, False, None, False, True, np.nan, False,
+                        False, False], dtype=object)
+    assert (var_vs_es.ko_period_calculator(series).tolist()
+            == ko_periods_loop(series.tolist()))
+
+
+def test_ko_periods_backends():
+    pytest.importorskip('numba')
+    flags = ko_flags(seed=1)
+    np.testing.assert_array_equal(
+            with_backend('numba', var_vs_es.ko_period_calculator, flags),
+            with_backend('numpy', var_vs_es.ko_period_calculator, flags)
+    )
+
+
+### Ordered window updates (risk_state) ###
+
+
+def test_ordered_update_ties(backend):
+    rng = np.random.default_rng(0)
+    # few distinct values, so that windows, leaving and new values tie
+    ordered = np.sort(rng.integers(-3, 4, (200, 25)).astype(float), axis=1)
+    old = ordered[np.arange(200), rng.integers(0, 25, 200)]
+    new = rng.integers(-4, 5, 200).astype(float)
+    new[: 20] = old[: 20]
+    np.testing.assert_array_equal(
+            var_vs_es.ordered_window_update(ordered, old, new),
+            ordered_update_loop(ordered, old, new)
+    )
+
+
+def test_ordered_update_sliding(backend):
+    rng = np.random.default_rng(1)
+    window = 30
+    pl = np.round(rng.normal(0, 1, (300, 40)), 1)
+    ordered = np.sort(pl[: window].T, axis=1)
+    for day in range(window, len(pl)):
+        ordered = var_vs_es.ordered_window_update(
+                ordered, pl[day - window], pl[day]
+        )
+        np.testing.assert_array_equal(
+                ordered, np.sort(pl[day - window + 1 : day + 1].T, axis=1)
+        )
+
+
+def test_ordered_update_backends():
+    pytest.importorskip('numba')
+    rng = np.random.default_rng(2)
+    ordered = np.sort(rng.integers(-5, 6, (100, 50)).astype(float), axis=1)
+    old = ordered[np.arange(100), rng.integers(0, 50, 100)]
+    new = rng.integers(-6, 7, 100).astype(float)
+    np.testing.assert_array_equal(
+            with_backend('numba', var_vs_es.ordered_window_update,
+                         ordered, old, new),
+            with_backend('numpy', var_vs_es.ordered_window_update,
+                         ordered, old, new)
+    )
+
+
+### Backend selection ###
+
+
+def test_kernel_backend():
+    backend = var_vs_es.kernel_backend('numpy')
+    assert backend.resolve() == 'numpy'
+    assert backend.get('backfill') is None
+    with pytest.raises(ValueError):
+        backend.select('fortran')
+    pytest.importorskip('numba')
+    backend.select('auto')
+    assert backend.resolve() == 'numba'
+    assert backend.get('ko_periods') is backend.get('ko_periods')
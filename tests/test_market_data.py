@@ -0,0 +1,80 @@
+"""Market data cache (price_store) and sources"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import var_vs_es
+
+
+class growing_source(object):
+    """Source publishing one more session of each ticker on every call to
+    publish, recording the requested date ranges"""
+    def __init__(self, sessions=10, published=5):
+        self.dates = pd.bdate_range('2019-01-01', periods=sessions)
+        self.published = published
+        self.requests = []
+
+    def __call__(self, ticker, start, end):
+        self.requests.append((ticker, start, end))
+        series = pd.Series(np.arange(len(self.dates), dtype=float) + 100,
+                           index=self.dates)
+        return series.iloc[: self.published].loc[start : end]
+
+
+def test_price_store_growing_source(tmp_path):
+    source = growing_source()
+    store = var_vs_es.price_store(str(tmp_path), source=source)
+    start, end = source.dates[0], source.dates[-1]
+    assert len(store.load('AAA', start, end)) == 5
+    assert len(source.requests) == 1
+
+    # sessions published since are requested, and only those
+    source.published = 10
+    series = store.load('AAA', start, end)
+    assert series.index.equals(source.dates)
+    assert source.requests[-1] == ('AAA', source.dates[5], end)
+
+    # fully covered: no further requests
+    store.load('AAA', start, end)
+    assert len(source.requests) == 2
+    offline = var_vs_es.price_store(str(tmp_path), offline=True)
+    pd.testing.assert_series_equal(offline.load('AAA', start, end), series)
+
+
+def test_price_store_missing_ticker(tmp_path):
+    store = var_vs_es.price_store(str(tmp_path), offline=True)
+    with pytest.raises(var_vs_es.market_data_missing):
+        store.load('AAA', '2019-01-01', '2019-02-01')
+
+
+def test_csv_dir_relative_to_working_folder(tmp_path, monkeypatch):
+    configs = []
+
+    def run(config):
+        configs.append(config)
+        raise var_vs_es.index_data_missing('no index')
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(var_vs_es, 'run', run)
+    with pytest.raises(SystemExit):
+        var_vs_es.main(['--csv-dir', 'prices', '--no-plots'])
+    assert configs[0]['csv_dir'] == os.path.join(str(tmp_path), 'prices')
+
+
+def test_market_data_union_sorted(tmp_path):
+    def source(ticker, start, end):
+        dates = pd.bdate_range('2019-01-01', periods=10)
+        dates = dates[5 :] if ticker == 'AAA' else dates[::2]
+        return pd.Series(100., index=dates).loc[start : end]
+
+    store = var_vs_es.price_store(str(tmp_path), source=source)
+    data, failures = var_vs_es.get_market_data(
+            ['AAA', 'BBB', 'CCC'], store=store,
+            start=pd.Timestamp('2019-01-01'), end=pd.Timestamp('2019-01-31')
+    )
+    assert not failures
+    assert list(data.columns) == ['AAA', 'BBB', 'CCC']
+    assert data.index.is_monotonic_increasing
+    assert len(data) == 8
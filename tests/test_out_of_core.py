@@ -0,0 +1,137 @@
+"""Out-of-core pipeline (memory-mapped float32 market data, deltas and P&L,
+processed in chunks) against the in-memory float64 pipeline, on synthetic
+market data with late listings and gaps"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import benchmark
+import var_vs_es
+
+
+INDEX = '^DJI'
+START = pd.Timestamp('2005-01-03')
+END = pd.Timestamp('2012-12-31')
+
+
+@pytest.fixture(scope='module')
+def csv_dir(tmp_path_factory):
+    var_vs_es.progress_bar.enabled = False
+    directory = tmp_path_factory.mktemp('csv')
+    data = benchmark.synthetic_market_data(
+            days=1800, tickers=12, index=INDEX, late_listing=0.3,
+            gaps=0.005, seed=7, start=START
+    )
+    for ticker in data.columns:
+        data[ticker].dropna().rename('Adj Close').to_csv(
+                os.path.join(directory, ticker + '.csv'),
+                index_label='Date', float_format='%.17g'
+        )
+    return directory
+
+
+@pytest.fixture
+def config(csv_dir, tmp_path):
+    return {'index': INDEX, 'csv_dir': str(csv_dir), 'start': str(START),
+            'end': str(END), 'portfolios': 12, 'securities': 5, 'seed': 3,
+            'window': 250, 'workers': 1, 'plots': False, 'chunk_size': 5,
+            'market_data': str(tmp_path / 'market_data'),
+            'stage_cache': str(tmp_path / 'stage_cache'),
+            'results_dir': str(tmp_path / 'results'),
+            'memmap_dir': str(tmp_path / 'memmap'),
+            'report': str(tmp_path / 'run_report.json')}
+
+
+@pytest.fixture
+def pl(config, csv_dir, tmp_path):
+    """P&L of the in-memory pipeline, and of the out-of-core pipeline in
+    float64 and float32"""
+    store = var_vs_es.price_store(config['market_data'],
+                                  source=var_vs_es.csv_source(csv_dir))
+    tickers = [t for t in var_vs_es.csv_source(csv_dir).tickers()
+               if t != INDEX]
+    data, failures = var_vs_es.get_market_data(
+            [INDEX] + tickers, align_to=INDEX, store=store, start=START,
+            end=END
+    )
+    assert not failures
+    data = var_vs_es.series_reconstructor(data, INDEX)
+    weights = var_vs_es.portfolio_generator(data, INDEX, tickers, 12, 5, 3)
+    expected = var_vs_es.pl_calculator(data, weights)
+
+    results = {}
+    for dtype in (np.float64, np.float32):
+        directory = str(tmp_path / np.dtype(dtype).name)
+        os.makedirs(directory)
+        dates, prices, failures = var_vs_es.memmap_market_data(
+                [INDEX] + tickers, os.path.join(directory, 'prices.npy'),
+                INDEX, 5, dtype, store=store, start=START, end=END
+        )
+        assert not failures
+        results[dtype] = var_vs_es.memmap_pl_calculator(
+                prices, dates, [INDEX] + tickers, weights, directory, INDEX,
+                10, 5, dtype
+        )
+    return expected, results
+
+
+def test_memmap_pl(pl):
+    expected, results = pl
+    for dtype, tolerance in ((np.float64, 1e-12), (np.float32, 1e-6)):
+        dates, values = results[dtype]
+        assert dates.equals(expected.index)
+        np.testing.assert_allclose(np.asarray(values, dtype=float),
+                                   expected.values, rtol=0,
+                                   atol=tolerance)
+
+
+def test_memmap_var_es(pl):
+    expected, results = pl
+    dates, values = results[np.float32]
+    values = pd.DataFrame(np.asarray(values, dtype=float), index=dates,
+                          columns=expected.columns)
+    for actual, reference in zip(var_vs_es.var_es_calculator(values, 250),
+                                 var_vs_es.var_es_calculator(expected, 250)):
+        np.testing.assert_allclose(actual.values, reference.values,
+                                   rtol=1e-5)
+
+
+def test_chunked_backtester_chunk_size(pl):
+    expected, results = pl
+    dates, values = results[np.float64]
+    summary, tests = var_vs_es.chunked_backtester(
+            values, dates, expected.columns, 250, chunk_size=12
+    )
+    for chunk_size in (1, 5):
+        chunked = var_vs_es.chunked_backtester(
+                values, dates, expected.columns, 250, chunk_size=chunk_size
+        )
+        pd.testing.assert_frame_equal(chunked[0], summary, rtol=1e-12)
+        # simulated p-values do not depend on the chunks of portfolios
+        pd.testing.assert_frame_equal(chunked[1], tests, rtol=1e-12)
+
+
+def test_out_of_core_run(config):
+    summary, tests = var_vs_es.run(config)
+    chunked_summary, chunked_tests = var_vs_es.run(
+            dict(config, out_of_core=True)
+    )
+    assert chunked_summary.index.equals(summary.index)
+    assert chunked_summary.columns.equals(summary.columns)
+    assert chunked_tests.index.equals(tests.index)
+    assert chunked_tests.columns.equals(tests.columns)
+
+    # KO percentages and streaks are unchanged by float32 storage; excess
+    # losses (extremes) differ by float32 rounding of P&L
+    ko = ~summary.index.str.startswith('Max Excess Loss')
+    pd.testing.assert_frame_equal(chunked_summary[ko], summary[ko])
+    pd.testing.assert_frame_equal(chunked_summary[~ko], summary[~ko],
+                                  rtol=1e-3)
+
+    statistics = tests.index.str.match(r'Z\d - ')
+    pd.testing.assert_frame_equal(chunked_tests[~statistics],
+                                  tests[~statistics])
+    pd.testing.assert_frame_equal(chunked_tests[statistics],
+                                  tests[statistics], rtol=0, atol=1e-5)
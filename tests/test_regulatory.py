@@ -0,0 +1,50 @@
+"""Regulatory back-test statistics (VaR coverage tests and Acerbi-Szekely
+ES tests) of a back-test cube"""
+import numpy as np
+import pandas as pd
+
+import var_vs_es
+
+
+def cube(days=2000, portfolios=6, seed=0):
+    """Back-test cube of normal P&L with exact VaR and ES forecasts, with
+    no 'Boom' or 'Stressed' days"""
+    rng = np.random.default_rng(seed)
+    pl = rng.standard_normal((days, portfolios))
+    scenario = rng.integers(1, 4, (days, portfolios)).astype(np.int8)
+    scenario[: 50] = -1
+    return var_vs_es.backtest_cube(
+            pd.RangeIndex(days),
+            pd.Index(['portfolio_{0}'.format(j) for j in range(portfolios)]),
+            scenario, pl, np.full((days, portfolios), -2.326),
+            np.full((days, portfolios), -2.665)
+    )
+
+
+def test_unobserved_scenarios():
+    tests = var_vs_es.regulatory_tests(cube(), simulations=200)
+    for scenario in var_vs_es.SCENARIOS + ['All']:
+        values = tests.xs(scenario, axis=1, level=1)
+        if scenario in ('Boom', 'Stressed'):
+            assert values.isna().all().all()
+        else:
+            assert values.notna().all().all()
+            assert ((values.filter(like='p-value', axis=0) >= 0)
+                    & (values.filter(like='p-value', axis=0) <= 1)
+                    ).all().all()
+
+
+def test_portfolio_subsets():
+    full = cube()
+    tests = var_vs_es.regulatory_tests(full, simulations=200)
+    subset = [1, 4]
+    part = var_vs_es.backtest_cube(
+            full.index, full.portfolios[subset], full.scenario[:, subset],
+            full.pl[:, subset], full.values['VaR'][:, subset],
+            full.values['ES'][:, subset]
+    )
+    p_values = tests.index.str.contains('p-value|Kupiec|Christoffersen')
+    pd.testing.assert_frame_equal(
+            var_vs_es.regulatory_tests(part, simulations=200)[p_values],
+            tests[p_values][full.portfolios[subset]]
+    )
@@ -0,0 +1,41 @@
+"""HTML report of the KPI summary (charts rendered on Agg canvases)"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import var_vs_es
+
+
+@pytest.fixture
+def summary():
+    var_vs_es.progress_bar.enabled = False
+    rng = np.random.default_rng(0)
+    pl = pd.DataFrame(rng.normal(0, 0.02, (800, 3)),
+                      index=pd.bdate_range('2010-01-01', periods=800),
+                      columns=['portfolio_{0}'.format(j) for j in range(3)])
+    scenarios = var_vs_es.scenario_identificator(pl, 250)
+    var, es = var_vs_es.var_es_calculator(pl, 250)
+    return var_vs_es.results_summary(
+            var_vs_es.backtester(scenarios, pl, var, es)
+    )
+
+
+def test_report_keeps_matplotlib_backend(summary, tmp_path):
+    matplotlib = pytest.importorskip('matplotlib')
+    backend = matplotlib.get_backend()
+    matplotlib.use('svg')
+    try:
+        path = var_vs_es.report_generator(
+                summary, directory=str(tmp_path), formats=('png', 'svg'),
+                workers=1
+        )
+        assert matplotlib.get_backend() == 'svg'
+    finally:
+        matplotlib.use(backend)
+    assert os.path.exists(path)
+    charts = os.listdir(os.path.join(str(tmp_path)))
+    for extension in ('.png', '.svg'):
+        assert (len([c for c in charts if c.endswith(extension)])
+                == len(summary.index))
@@ -0,0 +1,54 @@
+"""Daily update mode (incremental risk state) against a full run, on
+synthetic CSV market data that grows between runs"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import benchmark
+import var_vs_es
+
+
+def write_csv(data, directory):
+    for ticker in data.columns:
+        data[ticker].dropna().rename('Adj Close').to_csv(
+                os.path.join(directory, ticker + '.csv'),
+                index_label='Date', float_format='%.17g'
+        )
+
+
+def test_update_run(tmp_path, capsys):
+    var_vs_es.progress_bar.enabled = False
+    data = benchmark.synthetic_market_data(
+            days=900, tickers=8, late_listing=0.3, seed=11,
+            start='2010-01-04'
+    )
+    csv_dir = tmp_path / 'csv'
+    csv_dir.mkdir()
+    config = {'csv_dir': str(csv_dir), 'start': '2010-01-01',
+              'end': '2014-12-31', 'portfolios': 6, 'securities': 4,
+              'seed': 5, 'window': 250, 'workers': 1, 'plots': False,
+              'update': True, 'state': str(tmp_path / 'state.npz'),
+              'market_data': str(tmp_path / 'market_data'),
+              'stage_cache': str(tmp_path / 'stage_cache'),
+              'results_dir': str(tmp_path / 'results'),
+              'report': str(tmp_path / 'run_report.json')}
+
+    # first run builds the state; later sessions are published afterwards
+    write_csv(data.iloc[: 800], str(csv_dir))
+    var_vs_es.run(config)
+    write_csv(data, str(csv_dir))
+    capsys.readouterr()
+    summary, tests = var_vs_es.run(config)
+    assert 'Appending 100 days to the risk state' in capsys.readouterr().out
+    state = var_vs_es.risk_state.load(config['state'])
+    assert state.cube.index[-1] == data.index[-1]
+
+    full_summary, full_tests = var_vs_es.run(dict(config, update=False))
+    pd.testing.assert_frame_equal(summary, full_summary, rtol=1e-9)
+    pd.testing.assert_frame_equal(tests, full_tests, rtol=1e-9)
+    np.testing.assert_allclose(
+            state.cube.pl[-100 :],
+            var_vs_es.result_store(config['results_dir']).open().pl[-100 :],
+            rtol=1e-12
+    )
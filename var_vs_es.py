@@ -0,0 +1,3900 @@
+ # -*- coding: utf-8 -*-
+"""
+Created on Fri Mar  8 19:30:24 2019
+
+@author: nicholaserikdann
+
+Library of the VaR vs ES analysis: market data loading, series 
+reconstruction, portfolio generation, P&L, scenarios, VaR and ES models, 
+back-tests and summaries. The complete analysis is run through run(config),
+or from the command line (see main and VaR_vs_ES-Mar_2019.py).
+"""
+
+####################################
+#            LIBRARIES
+####################################
+
+import pandas as pd
+import numpy as np
+import datetime as dt
+import sys
+import os
+import re
+import time
+import math
+import argparse
+import concurrent.futures
+import contextlib
+from multiprocessing import shared_memory
+import functools
+import statistics
+import json
+import hashlib
+import pickle
+import operator
+import asyncio
+import urllib.parse
+import warnings
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+# optional dependencies (scraping, Yahoo Finance and plotting) are imported 
+# by the functions that use them, so that the library and cache-only runs 
+# start fast and run on servers without them (or without a display)
+
+####################################
+#             CONSTANTS
+####################################
+
+# scenario labels, ordered from most positive to most negative
+SCENARIOS = ['Boom', 'Positive', 'Neutral', 'Negative', 'Stressed']
+
+# back-test KPIs summarized for each risk metric, portfolio and scenario
+KPIS = ['% KOs', 'Max Period KO', 'Max Excess Loss']
+
+# regulatory back-test statistics, for VaR metrics (coverage tests and 
+# Basel traffic light zones) and for ES metrics (Acerbi-Szekely tests)
+VAR_TESTS = ['Kupiec POF', 'Christoffersen Independence', 
+             'Christoffersen Conditional Coverage', 'Traffic Light']
+ES_TESTS = ['Z1', 'Z1 p-value', 'Z2', 'Z2 p-value']
+
+# Basel traffic light zones (codes 0, 1 and 2 of the 'Traffic Light' test)
+TRAFFIC_LIGHTS = ['Green', 'Yellow', 'Red']
+
+# HTTP status lines of the query service (see query_service)
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 
+                405: 'Method Not Allowed'}
+
+# default run configuration (see run); relative paths are located in the 
+# module's folder
+DEFAULT_CONFIG = {
+        'index': '^DJI',  # Dow Jones Idustrial Average Index
+        'tickers': None,  # index constituents scraped from wiki_url
+        'wiki_url': 
+            'https://en.wikipedia.org/wiki/Dow_Jones_Industrial_Average',
+        'start': '1989-02-01',
+        'end': '2019-02-01',
+        'portfolios': 10,
+        'securities': 10,
+        'seed': None,
+        'horizon': 10,
+        'window': 500,
+        'confidence': 0.99,
+        'workers': None,  # number of CPUs
+        'offline': False,  # market data cache only
+        'market_data': 'market_data',
+        'csv_dir': None,  # local CSV market data source (see csv_source)
+        'stage_cache': 'stage_cache',
+        'cache_bytes': 2**30,
+        'report': 'run_report.json',
+        'plots': True,  # HTML report with KPI charts
+        'report_dir': 'report',
+        'formats': ['png'],
+        'quiet': False,  # summaries not displayed (e.g. batch jobs)
+        'out_of_core': False,  # memory-mapped float32 mode (large universes)
+        'memmap_dir': 'memmap',
+        'chunk_size': 256,  # securities / portfolios per chunk (out of core)
+        'backend': 'auto',  # sequential kernels (see kernel_backend)
+        'results_dir': 'results',  # queryable results (see result_store)
+        'update': False,  # daily update of the saved risk state
+        'state': 'risk_state.npz',  # risk state file (see risk_state)
+        'host': '127.0.0.1',
+        'port': 8765
+}
+
+####################################
+#        FUNCTIONS / CLASSES        
+####################################
+
+
+### Instrumentation ###
+
+
+class run_monitor(object):
+    """Object to collect stage-level instrumentation of a run: wall clock 
+    and CPU time, processed rows (throughput) and peak resident memory 
+    (RSS) of each stage, as a machine-readable run report
+    """
+    def __init__(self):
+        self.started = dt.datetime.now()
+        self.stages = []
+        self.depth = 0
+        
+    @contextlib.contextmanager
+    def stage(self, name, rows=None):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            wall = time.perf_counter() - wall
+            self.stages.append({
+                    'stage': name,
+                    'depth': self.depth,
+                    'wall_s': wall,
+                    'cpu_s': time.process_time() - cpu,
+                    'rows': rows,
+                    'rows_per_s': rows / wall if rows and wall > 0 else None,
+                    'peak_rss_mb': peak_rss_mb()
+            })
+    
+    def report(self):
+        return {'started': self.started.isoformat(),
+                'python': sys.version.split()[0],
+                'total_wall_s': sum(s['wall_s'] for s in self.stages 
+                                    if s['depth'] == 0),
+                'stages': self.stages
+        }
+    
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+# run instrumentation of the current process
+monitor = run_monitor()
+
+
+def instrumented(function):
+    """Decorator recording each call of a pipeline function as a stage of 
+    the run monitor (rows: length of the function's first argument)
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        rows = len(args[0]) if args and hasattr(args[0], '__len__') else None
+        with monitor.stage(function.__name__, rows):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def peak_rss_mb():
+    """Returns the peak resident memory (MB) of the current process, or 
+    None where it is not available (Windows)
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+### Main Functions ###
+
+
+def scrape_wiki(url):
+    """Scrapes wikipedia url and returns a list of tickers (symbols) for index
+    components
+    ---------------------------------------------------------------------------
+    inputs:
+        url: str type world wide web address of the index's wikipedia page 
+    outputs:
+        list type array of all the tickers comprising the index
+    ---------------------------------------------------------------------------
+    """       
+    import requests
+    from bs4 import BeautifulSoup
+    
+    website_url = requests.get(url).text
+    soup = BeautifulSoup (website_url, 'lxml')
+    table = soup.find('table', {'class' : 'wikitable sortable'})
+    links = table.findAll('a')
+    # obtain references from links
+    links_2 = []    
+    for l in links:
+        links_2.append(l.get('href'))
+    
+    # split links
+    split_links = []
+    for l in links_2:
+        split_links.append(l.split ("/"))
+    
+    # identify and group symbols in a list of tickers
+    tickers = []
+    for sl in split_links:
+        try:    
+            if sl[0] != '':
+                if sl[2]=='www.nyse.com' or sl[2]=='www.nasdaq.com':
+                    split = sl[4].split(":")
+                    if len(split) > 1:
+                        tickers.append(split[1])
+                    else:
+                        tickers.append(split[0].upper())
+                else:
+                    pass
+            else:
+                pass
+        except IndexError:
+            pass
+    
+    return tickers
+
+
+def get_data(ticker, start=dt.datetime(1989, 2, 1), 
+             end=dt.datetime(2019, 2, 1), source=None, store=None):
+    """ Creates Dataframe with market data for the provided ticker
+    ---------------------------------------------------------------------------
+    inputs:
+        ticker: str type representing the security's symbol in the market
+        start: first session of the requested period (01-02-1989 by default)
+        end: last session of the requested period (01-02-2019 by default)
+        source: callable market data source, with signature 
+        source(ticker, start, end) (Yahoo Finance by default, or the 
+        store's source if a store is provided)
+        store: price_store object used as local on-disk cache of market 
+        data (no cache by default)
+    outputs:
+        df structure with relevant market data (Adjusted Close) for sessions 
+        encompassed between start and end date
+    ---------------------------------------------------------------------------
+    """    
+    if store is not None:
+        return store.load(ticker, start, end, source)
+    if source is None:
+        source = yahoo_source
+    a_close = source(ticker, start, end)
+    
+    return a_close
+
+
+@instrumented
+def get_market_data(tickers, align_to=None, max_workers=8, max_attempts=5, 
+                    backoff=1.0, **kwargs):
+    """Creates DataFrame structure with market data for all provided tickers,
+    fetched concurrently with bounded retries for each ticker
+    ---------------------------------------------------------------------------
+    inputs:
+        tickers: list of str type symbols of the securities to be loaded
+        align_to: ticker whose sessions define the index of the resulting
+        structure (all sessions of every ticker by default)
+        max_workers: maximum number of concurrent requests (8 by default)
+        max_attempts: maximum number of attempts for each ticker (5 by 
+        default; tickers missing from the cache or a local source are not 
+        retried)
+        backoff: waiting time (seconds) before the first retry, doubled 
+        after each failed attempt (1 second by default)
+        kwargs: additional arguments for get_data (period, source, store)
+    outputs:
+        Tuple structure consisting of:
+            1. DataFrame structure with relevant market data (Adjusted 
+            Close) for every successfully loaded ticker
+            2. Dictionary structure with the exception raised by the last
+            attempt for each ticker that could not be loaded
+    ---------------------------------------------------------------------------
+    """
+    results = {}
+    failures = {}
+    progress = progress_bar(len(tickers), fmt=progress_bar.full)
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        futures = {
+                executor.submit(
+                        retry_call, get_data, (t,), kwargs, 
+                        max_attempts, backoff
+                ): t 
+                for t in tickers
+        }
+        for future in concurrent.futures.as_completed(futures):
+            ticker = futures[future]
+            try:
+                results[ticker] = future.result()
+            except Exception as e:
+                failures[ticker] = e
+            progress.current += 1
+            progress()
+    progress.done()
+    
+    # assemble aligned market data structure in a single concatenation, 
+    # preserving the order of the provided tickers
+    loaded = [t for t in tickers if t in results]
+    if not loaded:
+        return pd.DataFrame(), failures
+    data = pd.concat([results[t].rename(t) for t in loaded], axis=1, 
+                     sort=True)
+    if align_to in results:
+        data = data.reindex(results[align_to].index)
+    return data, failures
+
+
+@instrumented
+def series_reconstructor(df, reference='^DJI', references=None):
+    """Creates DataFrame structure, with filled missing values in time series.
+    Data points are generated by backward replication of reference 
+    index's returns
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant market data
+        reference: reference index whose returns will be replicated 
+        (Dow Jones by default)
+        references: Dictionary structure mapping tickers to the reference 
+        index to be replicated for them, if different from 'reference' 
+        (e.g. sector indices; None by default)
+    outputs:
+        Fully reconstructed (filled) DataFrame structure with relevant 
+        market data
+    ---------------------------------------------------------------------------
+    """
+    references = {} if references is None else references
+    # locate series with missing values (other than reference indices)
+    reference_tickers = set([reference] + list(references.values()))
+    incomplete_tickers = [
+            t for t, incomplete in df.isnull().any().items() 
+            if incomplete and t not in reference_tickers
+    ]
+    if not incomplete_tickers:
+        return df
+    ticker_refs = [references.get(t, reference) for t in incomplete_tickers]
+    unique_refs = list(dict.fromkeys(ticker_refs))
+    
+    # generate factor series for each reference index, as 1 + variation 
+    # (logN) to the following session, and their reverse cumulative product
+    # (product of all factors from each session to the end of the series).
+    # Missing factors are excluded from the product and counted, in order to
+    # invalidate the values reconstructed across them
+    log_ref = np.log(df[unique_refs].values.astype(float))
+    factors = np.full(log_ref.shape, np.nan)
+    factors[: -1] = 1 + (log_ref[1 :] - log_ref[: -1])
+    missing = np.isnan(factors)
+    rev_prod = np.cumprod(np.where(missing, 1, factors)[::-1], axis=0)[::-1]
+    rev_missing = np.cumsum(missing[::-1], axis=0)[::-1]
+    columns = [unique_refs.index(r) for r in ticker_refs]
+    rev_prod = rev_prod[:, columns]
+    rev_missing = rev_missing[:, columns]
+    
+    # locate, for each session, the next existing value of each series
+    # (anchor), and divide it by the reference index's factors of all 
+    # sessions in between, in order to obtain the missing values
+    values = df[incomplete_tickers].values.astype(float)
+    kernel = kernels.get('backfill')
+    if kernel is not None:
+        filled = kernel(values, rev_prod, rev_missing)
+    else:
+        n = len(values)
+        existing = ~np.isnan(values)
+        anchor = np.where(existing, np.arange(n)[:, np.newaxis], n)
+        anchor = np.minimum.accumulate(anchor[::-1], axis=0)[::-1]
+        has_anchor = anchor < n
+        anchor = np.where(has_anchor, anchor, 0)
+        reconstructed = (
+                np.take_along_axis(values, anchor, axis=0)
+                * np.take_along_axis(rev_prod, anchor, axis=0) 
+                / rev_prod
+        )
+        invalid = (
+                ~has_anchor
+                | (rev_missing 
+                   > np.take_along_axis(rev_missing, anchor, axis=0))
+        )
+        reconstructed[invalid] = np.nan
+        filled = np.where(existing, values, reconstructed)
+    # filled on a copy, leaving the provided market data unchanged (stage 
+    # inputs are identified by their content, see stage_node)
+    df = df.copy()
+    df[incomplete_tickers] = filled
+    
+    return df
+
+
+def portfolio_generator(df, index, tickers, k=10, n=10, seed=None):
+    """Creates DataFrame structure with the weights of the index portfolio 
+    and "k" n-stock (randomly picked, equally weighted) portfolios, for 
+    every security in the market data
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant market data
+        index: ticker of the index (proxy for a fully-diversified portfolio)
+        tickers: list of the index's constituents tickers
+        k: number of portfolios to generate (10 by default)
+        n: number of stocks for each random portfolio (10 by default)
+        seed: seed for the random number generator (None by default, for 
+        non-reproducible portfolios)
+    outputs:
+        DataFrame structure (portfolios x securities) consisting of:
+            index:
+                'portfolio_0': portfolio consisting solely of the index
+                (as proxy for a fully-diversified portfolio)
+                'portfolio_k': k portfolios consisting of n stocks 
+                randomly picked from index's constituents
+            values:
+                weight of each security in each portfolio
+    ---------------------------------------------------------------------------
+    """    
+    rng = np.random.default_rng(seed)
+    tickers = [t for t in tickers if t in df.columns]
+    weights = np.zeros((k+1, len(tickers)+1))
+    weights[0, 0] = 1
+    # pick n constituents for each portfolio, as the positions of the n 
+    # lowest values of a row of uniform random numbers
+    picks = np.argpartition(
+            rng.random((k, len(tickers))), n-1, axis=1
+    )[:, : n]
+    np.put_along_axis(weights[1 :, 1 :], picks, 1/n, axis=1)
+    
+    return pd.DataFrame(
+            weights, 
+            index=['portfolio_{0}'.format(i) for i in range(k+1)], 
+            columns=[index]+tickers
+    )
+
+
+def delta_calculator(df, n=10, logs=False):
+    """Calculates DataFrame values' variation (deltas) for the provided window
+    (lapsed period), as: logN of final value - LogN of initial value
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant market data.
+        n: number of days to generate variations based on (window)
+        logs: True if df already consists of logN of market data, so that 
+        logarithms can be shared among several windows (False by default)
+    outputs:
+        Dictionary structure consisting of market data variations for the 
+        provided window
+    ---------------------------------------------------------------------------
+    """    
+    log = df if logs else np.log(df)
+    df = log - log.shift(n)
+    df = df.dropna()
+    return df
+
+
+@instrumented
+def pl_calculator(df, weights, n=10, logs=False):
+    """Creates DataFrame structure with historic P&L vectors (n-day window
+    returns) for each portfolio, as a single product of the securities' 
+    deltas and the portfolios' weights
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant market data
+        weights: DataFrame structure (portfolios x securities) with the 
+        weight of each security in each portfolio (equal or custom weights)
+        n: number of days to generate variations based on (window)
+        logs: True if df already consists of logN of market data (False by 
+        default)
+    outputs:
+        DataFrame structure with daily P&L data (deltas) for each portfolio
+    ---------------------------------------------------------------------------
+    """
+    deltas = delta_calculator(df[weights.columns], n, logs)
+    return pd.DataFrame(
+            deltas.values @ weights.values.T, 
+            index=deltas.index, 
+            columns=weights.index
+    )
+
+
+@instrumented
+def scenario_identificator(df, window=500):
+    """Creates DataFrame structure with scenario labels for each porfolio. 
+    Scenario lables are generated based on the portfolio's return on a moving
+    window, and said return's location in the historic portfolio's window 
+    return distribution (assuming normality)
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant P&L data (deltas) for each
+        portfolio
+        window: size of the window (number of days) to be analyzed 
+        (500 by default - last two years)
+    outputs:
+        DataFrame structure consisting of scenario labels for each portfolio 
+        and daily moving window:
+            labels:
+                1. 'Boom': window's return is beyond two positive standard 
+                deviations from average returns - 2% of scenarios (approx)
+                2. 'Positive': window's return is between one and two positive 
+                standard deviations from average returns - 14% scenarios 
+                (approx)
+                3. 'Neutral': window's return is within one standard deviation
+                (either positive or negative) from average returns - 68% 
+                scenarios (approx)
+                4. 'Negative': window's return is between one and two negative
+                standard deviations from average returns - 14% scenarios 
+                (approx)
+                5. 'Stressed': window's return is beyond two negative standard 
+                deviations from average returns - 2% of scenaarios (approx)
+    ---------------------------------------------------------------------------
+    """    
+    print()
+    print('Calculating historic protfolio average returns for each window')
+
+    # for data points with sufficient past data to fill n-day window
+    # obtain average return of each rolling n-day window in the series
+    df_2 = window_means(df, window).dropna()
+    # obtain historical average n-day window returns for each portfolio
+    # and define scenario thresholds based on historical dispersion measures 
+    # for each portfolio
+    boom_th, pos_th, neg_th, stress_th = scenario_thresholds(df_2)
+    
+    # label each day's n-day window scenario, in accordance with historical
+    # return and thresholds defined for each portfolio
+    return scenario_labeler(df_2, boom_th, pos_th, neg_th, stress_th)
+
+
+def var_calculator(df, window=500, confidence=0.99, chunk_size=None):
+    """Creates DataFrame structure with daily historic VaR values (with 99% 
+    confidence by default) for each portfolio and each window
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant P&L data (deltas) for each
+        portfolio
+        window: size of the window (number of days) to be analyzed 
+        (500 by default - last two years)
+        confidence: confidence level for the VaR calculation (0.99 by 
+        default), or list of confidence levels to be calculated in a single 
+        pass (e.g. [0.95, 0.975, 0.99])
+        chunk_size: number of daily windows processed per batch (sized 
+        automatically by default)
+    outputs:
+        DataFrame structure consisting of daily historic VaR calculations at 
+        the confidence level for each portfolio. If a list of confidence 
+        levels is provided, Dictionary structure with confidence levels as 
+        keys and their VaR DataFrame structures as values
+    ---------------------------------------------------------------------------
+    """    
+    return var_es_calculator(df, window, confidence, chunk_size)[0]
+
+
+def es_calculator(df, window=500, confidence=0.99, chunk_size=None):
+    """Creates DataFrame structure with daily historic ES values (with 99% 
+    confidence by default) for each portfolio and each window
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant P&L data (deltas) for each
+        portfolio
+        window: size of the window (number of days) to be analyzed 
+        (500 by default - last two years)
+        confidence: confidence level for the ES calculation (0.99 by 
+        default), or list of confidence levels to be calculated in a single 
+        pass (e.g. [0.95, 0.975, 0.99])
+        chunk_size: number of daily windows processed per batch (sized 
+        automatically by default)
+    outputs:
+        DataFrame structure consisting of daily historic ES calculations at 
+        the confidence level for each portfolio. If a list of confidence 
+        levels is provided, Dictionary structure with confidence levels as 
+        keys and their ES DataFrame structures as values
+    ---------------------------------------------------------------------------
+    """    
+    return var_es_calculator(df, window, confidence, chunk_size)[1]
+
+
+@instrumented
+def var_es_calculator(df, window=500, confidence=0.99, chunk_size=None):
+    """Creates DataFrame structures with daily historic VaR and ES values 
+    (with 99% confidence by default) for each portfolio and each window, 
+    obtained from the same partially sorted windows
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant P&L data (deltas) for each
+        portfolio
+        window: size of the window (number of days) to be analyzed 
+        (500 by default - last two years)
+        confidence: confidence level for the calculations (0.99 by default), 
+        or list of confidence levels to be calculated in a single pass 
+        (e.g. [0.95, 0.975, 0.99])
+        chunk_size: number of daily windows processed per batch (sized 
+        automatically by default)
+    outputs:
+        Tuple structure consisting of:
+            1. DataFrame structure with daily historic VaR calculations for 
+            each portfolio
+            2. DataFrame structure with daily historic ES calculations for
+            each portfolio
+        If a list of confidence levels is provided, each element is a 
+        Dictionary structure with confidence levels as keys and the 
+        corresponding DataFrame structures as values
+    ---------------------------------------------------------------------------
+    """    
+    levels = [confidence] if np.isscalar(confidence) else list(confidence)
+    print()
+    print('Calculating historic VaR and ES values for each portfolio')
+    # calculate historical VaR for each porfolio, as the closest quantile to
+    # the confidence level percentile (position round(len*confidence) of 
+    # the window sorted in descending order), and historical ES as the 
+    # average of all quantiles beyond it
+    quantiles, tail_means = window_order_statistics(
+            df.values, 
+            window, 
+            [window - 1 - round(window*c) for c in levels], 
+            chunk_size,
+            tail_mean=True
+    )
+    var_dict = {}
+    es_dict = {}
+    for c, q, t in zip(levels, quantiles, tail_means):
+        var_dict[c] = pd.DataFrame(
+                q, index=df.index[window :], columns=df.columns
+        )
+        es_dict[c] = pd.DataFrame(
+                t, index=df.index[window :], columns=df.columns
+        )
+    if np.isscalar(confidence):
+        return var_dict[confidence], es_dict[confidence]
+    return var_dict, es_dict
+
+
+@instrumented
+def fhs_calculator(df, window=500, confidence=0.99, decay=0.94, 
+                   chunk_size=None):
+    """Creates DataFrame structures with daily filtered historical 
+    simulation (FHS) VaR and ES values (with 99% confidence by default) for
+    each portfolio and each window. Window returns are standardized by 
+    their EWMA volatility and rescaled to the volatility of the day
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant P&L data (deltas) for each
+        portfolio
+        window: size of the window (number of days) to be analyzed 
+        (500 by default - last two years)
+        confidence: confidence level for the calculations (0.99 by default), 
+        or list of confidence levels to be calculated in a single pass
+        decay: EWMA decay factor (0.94 by default - RiskMetrics)
+        chunk_size: number of daily windows processed per batch (sized 
+        automatically by default)
+    outputs:
+        Tuple structure with daily FHS VaR and ES DataFrame structures for 
+        each portfolio (Dictionary structures by confidence level if a list
+        of confidence levels is provided)
+    ---------------------------------------------------------------------------
+    """
+    levels = [confidence] if np.isscalar(confidence) else list(confidence)
+    print()
+    print('Calculating filtered historic VaR and ES values for each portfolio')
+    # standardized returns' order statistics are rescaled by the day's 
+    # volatility (positive scaling preserves the order of the window)
+    sigma = ewma_volatility(df, window, decay)
+    quantiles, tail_means = window_order_statistics(
+            df.values / sigma.values, 
+            window, 
+            [window - 1 - round(window*c) for c in levels], 
+            chunk_size,
+            tail_mean=True
+    )
+    scale = sigma.values[window :]
+    var_dict = {}
+    es_dict = {}
+    for c, q, t in zip(levels, quantiles, tail_means):
+        var_dict[c] = pd.DataFrame(
+                q * scale, index=df.index[window :], columns=df.columns
+        )
+        es_dict[c] = pd.DataFrame(
+                t * scale, index=df.index[window :], columns=df.columns
+        )
+    if np.isscalar(confidence):
+        return var_dict[confidence], es_dict[confidence]
+    return var_dict, es_dict
+
+
+@instrumented
+def ewma_calculator(df, window=500, confidence=0.99, decay=0.94):
+    """Creates DataFrame structures with daily parametric VaR and ES values 
+    (with 99% confidence by default) for each portfolio, based on EWMA 
+    (RiskMetrics) volatility and normally distributed returns with zero mean
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant P&L data (deltas) for each
+        portfolio
+        window: number of days before the first calculation, in order to 
+        align results with historic VaR and ES (500 by default)
+        confidence: confidence level for the calculations (0.99 by default), 
+        or list of confidence levels
+        decay: EWMA decay factor (0.94 by default - RiskMetrics)
+    outputs:
+        Tuple structure with daily parametric VaR and ES DataFrame 
+        structures for each portfolio (Dictionary structures by confidence 
+        level if a list of confidence levels is provided)
+    ---------------------------------------------------------------------------
+    """
+    levels = [confidence] if np.isscalar(confidence) else list(confidence)
+    print()
+    print('Calculating EWMA parametric VaR and ES values for each portfolio')
+    sigma = ewma_volatility(df, window, decay)[window :]
+    var_dict = {}
+    es_dict = {}
+    for c in levels:
+        # left tail quantile and average beyond it, of a standard normal
+        z = statistics.NormalDist().inv_cdf(1 - c)
+        var_dict[c] = sigma * z
+        es_dict[c] = -sigma * statistics.NormalDist().pdf(z) / (1 - c)
+    if np.isscalar(confidence):
+        return var_dict[confidence], es_dict[confidence]
+    return var_dict, es_dict
+
+
+@instrumented
+def attribution_calculator(deltas, weights, window=500, confidence=0.99, 
+                           dates=None, chunk_size=None):
+    """Creates DataFrame structures with component and marginal historic VaR
+    and ES of each security, for each portfolio and each window. The tail 
+    days of each window (the VaR day, and the days beyond it averaged by 
+    ES) are located once from the portfolios' P&L, and the securities' 
+    deltas on those days are gathered for all securities at once
+    ---------------------------------------------------------------------------
+    inputs:
+        deltas: DataFrame structure with the securities' n-day deltas (see 
+        delta_calculator), for every security of the weights
+        weights: DataFrame structure (portfolios x securities) with the 
+        weight of each security in each portfolio
+        window: size of the window (number of days) to be analyzed 
+        (500 by default - last two years)
+        confidence: confidence level for the calculations (0.99 by default)
+        dates: list of days to be attributed (every day from 'window' 
+        onwards by default; e.g. only the last day for daily runs)
+        chunk_size: number of daily windows processed per batch (sized 
+        automatically by default)
+    outputs:
+        Dictionary structure with DataFrame structures (days x (portfolio, 
+        security) columns) for:
+            1. 'Marginal VaR': security's delta on the VaR day (change of 
+            VaR per unit of weight)
+            2. 'Marginal ES': security's average delta on the ES tail days
+            3. 'Component VaR': weight x marginal VaR (adding up to the 
+            portfolio's VaR)
+            4. 'Component ES': weight x marginal ES (adding up to the 
+            portfolio's ES)
+    ---------------------------------------------------------------------------
+    """
+    print()
+    print('Calculating VaR and ES attribution for each portfolio')
+    deltas = deltas[weights.columns]
+    values = deltas.values.astype(float)
+    w = weights.values
+    pl = values @ w.T
+    rank = window - 1 - round(window*confidence)
+    index = deltas.index[window :]
+    positions = (np.arange(len(index)) if dates is None 
+                 else index.get_indexer(pd.Index(dates)))
+    if (positions < 0).any():
+        raise KeyError('Attribution dates must be calculation days')
+    n_portfolios, n_securities = w.shape
+    marginal_var = np.empty((len(positions), n_portfolios, n_securities))
+    marginal_es = np.full(marginal_var.shape, np.nan)
+    if chunk_size is None:
+        chunk_size = max(1, 2**22 // (window * n_portfolios 
+                                      + rank * n_portfolios * n_securities))
+    
+    windows = np.lib.stride_tricks.sliding_window_view(pl, window, axis=0)
+    progress = progress_bar(max(len(positions), 1), fmt=progress_bar.full)
+    for start in range(0, len(positions), chunk_size):
+        chunk = positions[start : start + chunk_size]
+        # tail days of each window (positions in the window, sorted by P&L)
+        block = windows[chunk]
+        tail = np.argpartition(block, rank, axis=-1)[..., : rank + 1]
+        tail = np.take_along_axis(
+                tail, 
+                np.argsort(np.take_along_axis(block, tail, axis=-1), 
+                           axis=-1, kind='stable'), 
+                axis=-1
+        )
+        days = tail + chunk[:, np.newaxis, np.newaxis]
+        stop = start + len(chunk)
+        marginal_var[start : stop] = values[days[..., rank]]
+        if rank > 0:
+            marginal_es[start : stop] = values[days[..., : rank]].mean(
+                    axis=-2
+            )
+        progress.current = stop
+        progress()
+    progress.done()
+    
+    columns = pd.MultiIndex.from_product([weights.index, weights.columns])
+    frame = lambda a: pd.DataFrame(
+            a.reshape(len(positions), -1), 
+            index=index[positions], 
+            columns=columns
+    )
+    return {'Marginal VaR': frame(marginal_var),
+            'Marginal ES': frame(marginal_es),
+            'Component VaR': frame(marginal_var * w),
+            'Component ES': frame(marginal_es * w)}
+
+
+@instrumented
+def bootstrap_calculator(df, window=500, confidence=0.99, simulations=100, 
+                         block=10, bands=(0.05, 0.95), batch=16, seed=0, 
+                         memory=2**26):
+    """Creates DataFrame structures with daily block bootstrap VaR and ES 
+    estimates (with 99% confidence by default) and their confidence bands,
+    for each portfolio and each window. Each window is resampled in blocks 
+    of consecutive days, and VaR and ES are calculated for every resample
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant P&L data (deltas) for each
+        portfolio
+        window: size of the window (number of days) to be analyzed 
+        (500 by default - last two years)
+        confidence: confidence level for the calculations (0.99 by default)
+        simulations: number of resamples of each window (100 by default)
+        block: number of consecutive days of each resampled block (10 by 
+        default, matching the overlap of 10-day deltas)
+        bands: quantiles of the resampled VaR and ES values reported as 
+        confidence bands ((0.05, 0.95) by default)
+        batch: number of daily windows sharing a random number stream (16 
+        by default). Streams are derived from the seed for each batch, so 
+        that results do not depend on how portfolios are distributed among
+        worker processes
+        seed: seed of the random number streams (0 by default)
+        memory: maximum size (bytes) of the resampled values processed at 
+        once (64 MB by default)
+    outputs:
+        Tuple structure consisting of:
+            1. DataFrame structure with daily bootstrap VaR estimates 
+            (average of the resamples' VaR) for each portfolio
+            2. DataFrame structure with daily bootstrap ES estimates 
+            3. Dictionary structure with band quantiles as keys and VaR 
+            band DataFrame structures as values
+            4. Dictionary structure with band quantiles as keys and ES 
+            band DataFrame structures as values
+    ---------------------------------------------------------------------------
+    """
+    print()
+    print('Calculating bootstrap VaR and ES values for each portfolio')
+    rank = window - 1 - round(window*confidence)
+    values = df.values.astype(float)
+    n_windows = max(len(values) - window, 0)
+    n_portfolios = values.shape[1]
+    windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)
+    var = np.empty((n_windows, n_portfolios))
+    es = np.full((n_windows, n_portfolios), np.nan)
+    var_bands = np.empty((len(bands), n_windows, n_portfolios))
+    es_bands = np.full((len(bands), n_windows, n_portfolios), np.nan)
+    # portfolios resampled at once, in order to bound memory usage
+    step = max(1, memory // (batch * simulations * window * 8))
+    
+    streams = np.random.SeedSequence(seed).spawn(-(-n_windows // batch))
+    progress = progress_bar(max(n_windows, 1), fmt=progress_bar.full)
+    for b, stream in enumerate(streams):
+        start = b * batch
+        stop = min(start + batch, n_windows)
+        positions = block_bootstrap_positions(
+                np.random.default_rng(stream), 
+                stop - start, simulations, window, block
+        )
+        for p in range(0, n_portfolios, step):
+            # resamples (windows x portfolios x simulations x window days)
+            resampled = np.take_along_axis(
+                    windows[start : stop, p : p + step, np.newaxis, :], 
+                    positions[:, np.newaxis], 
+                    axis=-1
+            )
+            block_values = np.partition(resampled, rank, axis=-1)
+            sim_var = block_values[..., rank]
+            var[start : stop, p : p + step] = sim_var.mean(axis=-1)
+            var_bands[:, start : stop, p : p + step] = np.quantile(
+                    sim_var, bands, axis=-1
+            )
+            if rank > 0:
+                sim_es = np.sort(
+                        block_values[..., : rank], axis=-1
+                ).mean(axis=-1)
+                es[start : stop, p : p + step] = sim_es.mean(axis=-1)
+                es_bands[:, start : stop, p : p + step] = np.quantile(
+                        sim_es, bands, axis=-1
+                )
+        progress.current = stop
+        progress()
+    progress.done()
+    
+    frame = lambda a: pd.DataFrame(
+            a, index=df.index[window :], columns=df.columns
+    )
+    return (frame(var), 
+            frame(es), 
+            {q: frame(a) for q, a in zip(bands, var_bands)},
+            {q: frame(a) for q, a in zip(bands, es_bands)})
+
+
+@instrumented
+def sweep_calculator(df, weights, horizons=(1, 5, 10, 20), 
+                     windows=(250, 500, 1000), confidences=(0.95, 0.975, 0.99),
+                     chunk_size=None, dtype=np.float64):
+    """Creates back-test cube structures for a grid of P&L horizons, window
+    sizes and confidence levels in a single invocation. Logarithms of market
+    data are calculated once for all horizons, scenarios are identified once
+    for each horizon and window, and VaR and ES for all confidence levels 
+    are obtained from the same partially sorted windows
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant market data
+        weights: DataFrame structure (portfolios x securities) with the 
+        weight of each security in each portfolio
+        horizons: number of days of the P&L variations ((1, 5, 10, 20) by 
+        default)
+        windows: sizes of the windows (number of days) to be analyzed 
+        ((250, 500, 1000) by default)
+        confidences: confidence levels for the calculations ((0.95, 0.975, 
+        0.99) by default)
+        chunk_size: number of daily windows processed per batch (sized 
+        automatically by default)
+        dtype: floating point type of the back-test cubes (see backtester)
+    outputs:
+        Dictionary structure with (horizon, window, confidence) tuples as 
+        keys and backtest_cube structures as values (see sweep_summary)
+    ---------------------------------------------------------------------------
+    """
+    log_prices = np.log(df[weights.columns])
+    cubes = {}
+    for horizon in horizons:
+        hist_pl = pl_calculator(log_prices, weights, horizon, logs=True)
+        for window in windows:
+            scenarios = scenario_identificator(hist_pl, window)
+            var, es = var_es_calculator(
+                    hist_pl, window, list(confidences), chunk_size
+            )
+            for c in confidences:
+                cubes[horizon, window, c] = backtester(
+                        scenarios, hist_pl, var[c], es[c], dtype
+                )
+    return cubes
+
+
+@instrumented
+def backtester(scenario_matrix, pl_matrix, var_matrix, es_matrix, 
+               dtype=np.float64, models=None):
+    """Creates 3-D back-test cube structure with relevant metrics for each 
+    portfolio, in order to perform Back-test analysis for VaR and ES
+    ---------------------------------------------------------------------------
+    inputs:
+        scenario_matrix:
+            DataFrame structure with daily scenario lables for each porftolio
+        PL_matrix:
+            DataFrame structure with daily P&L data (deltas) for each portfolio
+        var_matrix:
+            DataFrame structure with daily VaR calculations for each portfolio
+        es_matrix:
+            DataFrame structure with daily ES calculations for each portfolio
+        dtype: floating point type for P&L, VaR and ES values (float64 by 
+        default, float32 halves the memory usage)
+        models: Dictionary structure with additional risk models to be 
+        back-tested, with model names as keys and tuples of VaR and ES 
+        DataFrame structures as values (e.g. {'FHS': fhs_calculator(df)};
+        None by default)
+    outputs:
+        backtest_cube structure (typed arrays; to_frame() provides the 
+        equivalent MultiIndex DataFrame structure) consisting of 3 
+        dimensions:
+            1. Timesteps: each portfolio's historical series for each metric
+            2. Metrics:
+                2.1. 'Scenario': daily scenario label for the portfolio
+                2.2. 'P&L': daily n-day window return for the portfolio
+                2.3. 'VaR': daily VaR calculation for the portfolio
+                2.4. 'ES': daily ES calculation for the portfolio
+                2.5. 'VaR - Back-test': historic daily boolean series where:
+                    'True': P&L value is inferior to VaR value (VaR KO)
+                    'False': P&L value is superior to VaR value (VaR OK)
+                2.6. 'ES - Back-test': historic daily boolean series where:
+                    'True': P&L value is inferior to ES value (ES KO)
+                    'False': P&L value is superior to ES value (ES OK)
+                2.7. 'VaR - <model>', 'ES - <model>' and their back-tests,
+                for each additional risk model
+            3. Portfolios: each portfolio is back-tested indivdually
+    ---------------------------------------------------------------------------
+    """    
+    idx = scenario_matrix.index
+    lvl_1 = scenario_matrix.columns
+    # scenario labels as int8 codes of SCENARIOS (-1 for missing labels)
+    scenarios = np.empty(scenario_matrix.shape, dtype=np.int8)
+    for j, portfolio in enumerate(lvl_1):
+        scenarios[:, j] = pd.Categorical(
+                scenario_matrix[portfolio], categories=SCENARIOS
+        ).codes
+    align = lambda m: m.reindex(index=idx, columns=lvl_1).values.astype(dtype)
+    models = {} if models is None else models
+    return backtest_cube(
+            idx, lvl_1, scenarios, align(pl_matrix), align(var_matrix), 
+            align(es_matrix), 
+            {name: (align(m_var), align(m_es)) 
+             for name, (m_var, m_es) in models.items()}
+    )
+
+
+@instrumented
+def results_summary(cube):
+    """Creates 3-D DataFrame strucutre with relevant KPI summary regarding 
+    metrics' back-test and performance analysis for VaR and ES
+    ---------------------------------------------------------------------------
+    inputs:
+        cube: backtest_cube structure (or equivalent 3-D DataFrame 
+        structure) consisting of historic metric calculations and 
+        performance for each portfolio
+    outputs:
+        DataFrame structure consisting of 3 dimensions:
+            1. KPIs:
+                1.1. '% KOs - VaR': Ratio between number of KO days for VaR
+                and total observations
+                1.2. '%KOs - ES': Ratio between number of KO days for ES
+                and total observations
+                1.3. 'Max Period KO - VaR': Maximum number of consecutive 
+                KO days for VaR
+                1.4. 'Max Period KO - ES': Maximum number of consecutive 
+                KO days for ES
+                1.5. 'Max Excess Loss - VaR: Maximum loss incurred in excess 
+                of VaR
+                1.6. 'Max Excess Loss - ES': Maximum loss incurred in excess 
+                of ES
+            2. Scenarios: KPIs are calculated for each scenario
+            ('Boom', 'Positive', 'Neutral', 'Negative' and 'Stressed')
+            3. Portfolios: each portfolio summarized individually
+    ---------------------------------------------------------------------------
+    """    
+    if isinstance(cube, pd.DataFrame):
+        cube = backtest_cube.from_frame(cube)
+    print()
+    print('Summarizing back-test results for each portfolio')
+    aggregates = backtest_aggregates(cube.scenario, cube.pl, cube.values)
+    return summary_matrix(aggregates, len(cube), cube.portfolios)
+
+
+@instrumented
+def summary_intervals(cube, resamples=1000, block=20, bands=(0.05, 0.95), 
+                      chunk_size=100, seed=0):
+    """Creates DataFrame structures with confidence intervals of the KPI 
+    summary (see results_summary), from a stationary block bootstrap of the
+    back-test series: each resample concatenates blocks of consecutive days
+    (of random, geometrically distributed lengths) starting at random days,
+    and KPIs are calculated for every resample
+    ---------------------------------------------------------------------------
+    inputs:
+        cube: backtest_cube structure (or equivalent 3-D DataFrame 
+        structure) consisting of historic metric calculations and 
+        performance for each portfolio
+        resamples: number of bootstrap resamples (1000 by default)
+        block: average number of consecutive days of each block (20 by 
+        default)
+        bands: quantiles of the resampled KPIs reported as interval bounds
+        ((0.05, 0.95) by default)
+        chunk_size: number of resamples evaluated at once (100 by default)
+        seed: seed of the random number streams (0 by default). Each 
+        resample has its own stream derived from the seed, so that 
+        intervals do not depend on chunk_size
+    outputs:
+        Dictionary structure with band quantiles as keys and DataFrame 
+        structures with the KPI summary layout (KPIs x (portfolio, 
+        scenario)) as values
+    ---------------------------------------------------------------------------
+    """
+    if isinstance(cube, pd.DataFrame):
+        cube = backtest_cube.from_frame(cube)
+    print()
+    print('Calculating bootstrap intervals of back-test KPIs')
+    n_obs = len(cube)
+    n_portfolios = len(cube.portfolios)
+    kpis = [[] for _ in range(n_portfolios)]
+    
+    streams = np.random.SeedSequence(seed).spawn(resamples)
+    progress = progress_bar(max(resamples, 1), fmt=progress_bar.full)
+    for start in range(0, resamples, chunk_size):
+        n = min(chunk_size, resamples - start)
+        # resampled days (days x resamples), shared by all portfolios
+        days = np.concatenate([
+                stationary_bootstrap_positions(
+                        np.random.default_rng(stream), 1, n_obs, block
+                )
+                for stream in streams[start : start + n]
+        ]).T
+        for j in range(n_portfolios):
+            # each resample is evaluated as a column of the back-test 
+            # aggregates
+            aggregates = backtest_aggregates(
+                    cube.scenario[days, j], 
+                    cube.pl[days, j], 
+                    {m: v[days, j] for m, v in cube.values.items()}
+            )
+            summary = summary_matrix(aggregates, n_obs, pd.RangeIndex(n))
+            kpis[j].append(summary.values.reshape(len(summary), n, -1))
+        progress.current = start + n
+        progress()
+    progress.done()
+    
+    # interval bounds (bands x KPIs x portfolios x scenarios); KPIs not 
+    # observed in any resample are missing
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        bounds = np.stack([
+                np.nanquantile(np.concatenate(k, axis=1), bands, axis=1)
+                for k in kpis
+        ], axis=2)
+    columns = pd.MultiIndex.from_product([cube.portfolios, SCENARIOS])
+    return {q: pd.DataFrame(b.reshape(len(summary), -1), 
+                            index=summary.index, 
+                            columns=columns)
+            for q, b in zip(bands, bounds)}
+
+
+def sweep_summary(cubes):
+    """Creates DataFrame structure with the KPI summary of each 
+    configuration of a sweep (see sweep_calculator)
+    ---------------------------------------------------------------------------
+    inputs:
+        cubes: Dictionary structure with (horizon, window, confidence) 
+        tuples as keys and backtest_cube structures as values
+    outputs:
+        DataFrame structure with KPIs (see results_summary) for each 
+        horizon, window and confidence level (rows), portfolio and scenario
+        (columns)
+    ---------------------------------------------------------------------------
+    """
+    return pd.concat(
+            {key: results_summary(cube) for key, cube in cubes.items()},
+            names=['Horizon', 'Window', 'Confidence', 'KPI']
+    )
+
+
+@instrumented
+def regulatory_tests(cube, confidence=0.99, simulations=1000, batch=64, 
+                     seed=0, memory=2**26):
+    """Creates DataFrame structure with regulatory back-test statistics for
+    each risk metric, portfolio and scenario (as well as for all scenarios)
+    ---------------------------------------------------------------------------
+    inputs:
+        cube: backtest_cube structure (or equivalent 3-D DataFrame 
+        structure) consisting of historic metric calculations and 
+        performance for each portfolio
+        confidence: confidence level of the risk metrics (0.99 by default)
+        simulations: number of simulations for the p-values of the 
+        Acerbi-Szekely tests (1000 by default)
+        batch: number of portfolios simulated at once (64 by default); 
+        each portfolio has its own random number streams, keyed by its 
+        label, so that simulated p-values depend neither on memory nor on 
+        the portfolios tested with it
+        seed: seed of the random number streams (0 by default)
+        memory: approximate maximum size (bytes) of the simulated values 
+        processed at once (64 MB by default)
+    outputs:
+        DataFrame structure consisting of 3 dimensions:
+            1. Tests:
+                1.1. 'Kupiec POF - <VaR metric>': p-value of the proportion
+                of failures (unconditional coverage) test
+                1.2. 'Christoffersen Independence - <VaR metric>': p-value
+                of the independence of consecutive KO days test
+                1.3. 'Christoffersen Conditional Coverage - <VaR metric>':
+                p-value of the joint coverage and independence test
+                1.4. 'Traffic Light - <VaR metric>': Basel zone of the 
+                number of KO days (codes of TRAFFIC_LIGHTS)
+                1.5. 'Z1 - <ES metric>', 'Z2 - <ES metric>': Acerbi-Szekely
+                statistics (negative values for underestimated ES), with 
+                their simulated p-values ('Z1 p-value', 'Z2 p-value')
+            2. Scenarios: tests are calculated for each scenario, and for 
+            all scenarios ('All')
+            3. Portfolios: each portfolio tested individually
+    ---------------------------------------------------------------------------
+    """
+    if isinstance(cube, pd.DataFrame):
+        cube = backtest_cube.from_frame(cube)
+    print()
+    print('Calculating regulatory back-test statistics for each portfolio')
+    alpha = 1 - confidence
+    complete = (cube.scenario >= 0) & ~np.isnan(cube.pl)
+    for metric_values in cube.values.values():
+        complete &= ~np.isnan(metric_values)
+    codes = np.where(complete, cube.scenario, -1)
+    masks = [codes == i for i in range(len(SCENARIOS))] + [complete]
+    
+    tests = {}
+    var_metrics = [m for m in cube.values if m.startswith('VaR')]
+    for metric in var_metrics:
+        ko = ~cube.backtests[metric] & complete
+        coverage = coverage_tests(ko, complete, masks, alpha)
+        for test in VAR_TESTS:
+            tests[test + ' - ' + metric] = coverage[test]
+    
+    es_metrics = ['ES' + m[len('VaR') :] for m in var_metrics]
+    keys = [int(content_hash(str(p))[:8], 16) for p in cube.portfolios]
+    for metric in es_metrics:
+        var = cube.values['VaR' + metric[len('ES') :]]
+        results = acerbi_szekely_tests(
+                cube.pl, var, cube.values[metric], codes, alpha, 
+                simulations, batch, seed, memory, keys
+        )
+        for test in ES_TESTS:
+            tests[test + ' - ' + metric] = results[test]
+    
+    index = ([test + ' - ' + m for test in VAR_TESTS for m in var_metrics]
+             + [test + ' - ' + m for test in ES_TESTS for m in es_metrics])
+    return pd.DataFrame(
+            [tests[k].T.ravel() for k in index],
+            index=index,
+            columns=pd.MultiIndex.from_product(
+                    [cube.portfolios, SCENARIOS + ['All']]
+            )
+    )
+
+
+def parallel_calculator(function, df, *args, workers=None, chunk_size=None,
+                        **kwargs):
+    """Applies a portfolio-wise calculation (e.g. scenario_identificator or
+    var_es_calculator) to chunks of portfolios in a pool of worker 
+    processes. The P&L matrix is placed in shared memory, so that workers 
+    access it without copying, and results are gathered in portfolio order
+    ---------------------------------------------------------------------------
+    inputs:
+        function: module-level function taking the P&L DataFrame structure 
+        (for a chunk of portfolios) as first argument
+        df: DataFrame structure with all relevant P&L data (deltas) for each
+        portfolio
+        args: additional arguments for the function; DataFrame structures 
+        with portfolio columns are split in the same chunks as df
+        workers: number of worker processes (number of CPUs by default; 
+        1 for a calculation in the current process)
+        chunk_size: number of portfolios per task (evenly distributed among
+        workers by default)
+        kwargs: additional keyword arguments for the function
+    outputs:
+        Result of the function for all portfolios (DataFrame structures, 
+        and tuples or dictionaries of DataFrame structures, are combined 
+        along portfolios)
+    ---------------------------------------------------------------------------
+    """
+    workers = os.cpu_count() if workers is None else workers
+    if workers <= 1:
+        return function(df, *args, **kwargs)
+    n = df.shape[1]
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(n / workers))
+    bounds = [(a, min(a + chunk_size, n)) for a in range(0, n, chunk_size)]
+    
+    # column-major copy of the P&L matrix in shared memory, so that each 
+    # chunk of portfolios is a contiguous block
+    values = np.asfortranarray(df.values, dtype=np.float64)
+    shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+    try:
+        np.ndarray(values.shape, values.dtype, shm.buf, order='F')[:] = values
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            futures = [
+                    executor.submit(
+                            shared_chunk_worker, 
+                            function, 
+                            shm.name, 
+                            values.shape, 
+                            df.index, 
+                            df.columns[a : b], 
+                            a, 
+                            b,
+                            [x[df.columns[a : b]] 
+                             if isinstance(x, pd.DataFrame) else x 
+                             for x in args],
+                            kwargs
+                    )
+                    for a, b in bounds
+            ]
+            results = [f.result() for f in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+    return combine_results(results)
+
+
+@instrumented
+def memmap_market_data(tickers, path, align_to, chunk_size=256, 
+                       dtype=np.float32, **kwargs):
+    """Creates memory-mapped array (on disk) with market data for a large 
+    universe of tickers, loaded in chunks of tickers so that only one chunk
+    of market data is held in memory at once
+    ---------------------------------------------------------------------------
+    inputs:
+        tickers: list of str type symbols of the securities to be loaded
+        path: path of the array file (NumPy .npy format)
+        align_to: ticker whose sessions define the rows of the array
+        chunk_size: number of tickers loaded at once (256 by default)
+        dtype: floating point type of the array (float32 by default, 
+        halving the size of float64 market data)
+        kwargs: additional arguments for get_market_data (period, source, 
+        store)
+    outputs:
+        Tuple structure consisting of:
+            1. DatetimeIndex structure with the sessions of align_to
+            2. Memory-mapped array structure (sessions x tickers, column-
+            major so that chunks of tickers are contiguous on disk) with 
+            relevant market data (Adjusted Close; NaN for tickers that 
+            could not be loaded)
+            3. Dictionary structure with the exception raised for each 
+            ticker that could not be loaded
+    ---------------------------------------------------------------------------
+    """
+    reference, failures = get_market_data([align_to], align_to, **kwargs)
+    if align_to in failures:
+        return pd.DatetimeIndex([]), None, failures
+    dates = reference.index
+    prices = memmap_array(path, (len(dates), len(tickers)), dtype)
+    for start in range(0, len(tickers), chunk_size):
+        chunk = list(tickers[start : start + chunk_size])
+        data, chunk_failures = get_market_data(chunk, **kwargs)
+        failures.update(chunk_failures)
+        prices[:, start : start + len(chunk)] = data.reindex(
+                index=dates, columns=chunk
+        ).values
+    prices.flush()
+    return dates, prices, failures
+
+
+@instrumented
+def memmap_pl_calculator(prices, dates, columns, weights, directory, 
+                         reference='^DJI', n=10, chunk_size=256, 
+                         dtype=np.float32):
+    """Creates memory-mapped arrays (on disk) with the securities' n-day 
+    deltas and the portfolios' historic P&L vectors, streaming over chunks 
+    of securities and portfolios so that memory usage does not depend on 
+    the size of the universe. Missing values are reconstructed for each 
+    chunk of securities (see series_reconstructor), and only days with 
+    deltas for every security are kept (as in pl_calculator)
+    ---------------------------------------------------------------------------
+    inputs:
+        prices: array structure (sessions x securities) with market data 
+        (e.g. memory-mapped, see memmap_market_data)
+        dates: DatetimeIndex structure with the sessions of prices
+        columns: list of tickers of the prices' columns
+        weights: DataFrame structure (portfolios x securities) with the 
+        weight of each security in each portfolio
+        directory: folder of the array files (deltas.npy and pl.npy)
+        reference: reference index for series reconstruction (Dow Jones by
+        default)
+        n: number of days to generate variations based on (10 by default)
+        chunk_size: number of securities or portfolios processed at once 
+        (256 by default)
+        dtype: floating point type of the arrays (float32 by default). 
+        Calculations are performed in float64 on each chunk; float32 
+        storage rounds deltas and P&L to about 7 significant digits 
+        (relative error below 6e-8 of each stored value), so that P&L 
+        differs from float64 by rounding of the deltas (absolute errors up
+        to about 1e-7 for 10-day log returns), and VaR and ES by relative 
+        errors of order 1e-6 (KO days only change for values tied after 
+        rounding)
+    outputs:
+        Tuple structure consisting of:
+            1. DatetimeIndex structure with the days of the P&L vectors
+            2. Memory-mapped array structure (days x portfolios, column-
+            major) with daily P&L data (deltas) for each portfolio
+    ---------------------------------------------------------------------------
+    """
+    positions = [list(columns).index(t) for t in weights.columns]
+    ref = np.asarray(prices[:, list(columns).index(reference)], dtype=float)
+    n_securities = len(positions)
+    deltas = memmap_array(os.path.join(directory, 'deltas.npy'), 
+                          (max(len(dates) - n, 0), n_securities), dtype)
+    valid = np.ones(len(deltas), dtype=bool)
+    for start in range(0, n_securities, chunk_size):
+        chunk = positions[start : start + chunk_size]
+        df = pd.DataFrame(np.asarray(prices[:, chunk], dtype=float), 
+                          index=dates, columns=range(len(chunk)))
+        df[reference] = ref
+        log = np.log(
+                series_reconstructor(df, reference)[range(len(chunk))].values
+        )
+        chunk_deltas = log[n :] - log[: -n] if n else log[: 0]
+        deltas[:, start : start + len(chunk)] = chunk_deltas
+        valid &= ~np.isnan(chunk_deltas).any(axis=1)
+    deltas.flush()
+    
+    # P&L as the product of deltas and weights, accumulated (in float64) 
+    # for each chunk of portfolios over chunks of securities
+    w = weights.values
+    pl = memmap_array(os.path.join(directory, 'pl.npy'), 
+                      (int(valid.sum()), len(w)), dtype)
+    for start in range(0, len(w), chunk_size):
+        stop = min(start + chunk_size, len(w))
+        total = np.zeros((len(pl), stop - start))
+        for s in range(0, n_securities, chunk_size):
+            block = w[start : stop, s : s + chunk_size]
+            if block.any():
+                total += (np.asarray(deltas[:, s : s + chunk_size][valid], 
+                                     dtype=float) @ block.T)
+        pl[:, start : stop] = total
+    pl.flush()
+    return dates[n :][valid], pl
+
+
+@instrumented
+def chunked_backtester(pl, dates, portfolios, window=500, confidence=0.99, 
+                       chunk_size=256):
+    """Back-tests portfolios in chunks of a (memory-mapped) P&L array: 
+    scenarios, historic, filtered historic and EWMA VaR and ES, back-test 
+    cube, KPI summary and regulatory back-test statistics are obtained for 
+    each chunk of portfolios, so that only one chunk is held in memory
+    ---------------------------------------------------------------------------
+    inputs:
+        pl: array structure (days x portfolios) with daily P&L data (e.g. 
+        memory-mapped, see memmap_pl_calculator)
+        dates: DatetimeIndex structure with the days of the P&L vectors
+        portfolios: index of portfolios
+        window: size of the window (number of days) to be analyzed 
+        (500 by default)
+        confidence: confidence level for the calculations (0.99 by default)
+        chunk_size: number of portfolios processed at once (256 by default)
+    outputs:
+        Tuple structure consisting of:
+            1. DataFrame structure with the KPI summary (see 
+            results_summary)
+            2. DataFrame structure with regulatory back-test statistics 
+            (see regulatory_tests)
+    ---------------------------------------------------------------------------
+    """
+    summaries = []
+    tests = []
+    for start in range(0, len(portfolios), chunk_size):
+        hist_pl = pd.DataFrame(
+                np.asarray(pl[:, start : start + chunk_size], dtype=float), 
+                index=dates, 
+                columns=portfolios[start : start + chunk_size]
+        )
+        scenarios = scenario_identificator(hist_pl, window)
+        var, es = var_es_calculator(hist_pl, window, confidence)
+        cube = backtester(
+                scenarios, hist_pl, var, es, 
+                models={'FHS': fhs_calculator(hist_pl, window, confidence), 
+                        'EWMA': ewma_calculator(hist_pl, window, confidence)}
+        )
+        summaries.append(results_summary(cube))
+        tests.append(regulatory_tests(cube, confidence))
+        del hist_pl, scenarios, var, es, cube
+    return pd.concat(summaries, axis=1), pd.concat(tests, axis=1)
+
+
+def report_generator(summary, tests=None, directory='report', 
+                     formats=('png',), workers=None):
+    """Renders the KPI charts (one chart per KPI, with a line per portfolio 
+    across scenarios) headlessly in worker processes, and assembles them 
+    with the summary tables in a static HTML report. Charts whose data did 
+    not change since the previous report are not rendered again
+    ---------------------------------------------------------------------------
+    inputs:
+        summary: DataFrame structure with the KPI summary (see 
+        results_summary)
+        tests: DataFrame structure with regulatory back-test statistics 
+        (see regulatory_tests; None by default)
+        directory: folder of the report ('report' by default)
+        formats: image formats of the charts (('png',) by default, e.g. 
+        ('png', 'svg'))
+        workers: number of worker processes (number of CPUs by default, 1 
+        for rendering in the current process)
+    outputs:
+        Path of the HTML report
+    ---------------------------------------------------------------------------
+    """
+    print()
+    print('Rendering back-test report')
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, 'charts.json')
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+    
+    # charts identified by a hash of their data, title and formats (and of
+    # the rendering code)
+    charts = []
+    pending = []
+    for kpi in summary.index:
+        name = re.sub(r'[^0-9A-Za-z]+', '_', kpi).strip('_').lower()
+        paths = [os.path.join(directory, name + '.' + f) for f in formats]
+        key = content_hash((chart_worker, summary.loc[kpi], kpi, formats))
+        charts.append((kpi, os.path.basename(paths[0])))
+        if (manifest.get(name) != key 
+                or not all(os.path.exists(p) for p in paths)):
+            pending.append((name, key, summary.loc[kpi], kpi, paths))
+    
+    workers = os.cpu_count() if workers is None else workers
+    if workers <= 1 or len(pending) <= 1:
+        for _, _, series, kpi, paths in pending:
+            chart_worker(series, kpi, paths)
+    elif pending:
+        with concurrent.futures.ProcessPoolExecutor(
+                min(workers, len(pending))
+        ) as executor:
+            futures = [executor.submit(chart_worker, series, kpi, paths) 
+                       for _, _, series, kpi, paths in pending]
+            for future in futures:
+                future.result()
+    for name, key, _, _, _ in pending:
+        manifest[name] = key
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print('{0} charts rendered, {1} unchanged'.format(
+            len(pending), len(charts) - len(pending)
+    ))
+    
+    report_path = os.path.join(directory, 'report.html')
+    with open(report_path, 'w') as f:
+        f.write(report_html(summary, tests, charts))
+    return report_path
+
+
+def query_service(directory, host='127.0.0.1', port=8765):
+    """Serves queries over persisted results (see result_store) through a 
+    local HTTP service (asyncio), answering with JSON documents:
+        /portfolios: list of portfolios and first and last days
+        /risk?portfolio=P&date=D: scenario, P&L, VaR, ES (and additional 
+        risk models) and KO flags of portfolio P on day D (or from start 
+        to end: /risk?portfolio=P&start=D1&end=D2)
+        /summary?portfolio=P: KPI summary and regulatory back-test 
+        statistics of portfolio P
+    Results are read from memory-mapped arrays, so that each query only 
+    reads the requested days
+    ---------------------------------------------------------------------------
+    inputs:
+        directory: folder of the persisted results
+        host: address of the service (local only by default)
+        port: port of the service (8765 by default)
+    ---------------------------------------------------------------------------
+    """
+    client = local_query_client(result_store(directory).open())
+    
+    async def handle(reader, writer):
+        try:
+            request = await reader.readline()
+            # request headers are not used
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request.decode('latin-1').split()
+            if len(parts) < 2 or parts[0] != 'GET':
+                status, payload = 405, {'error': 'Only GET is supported'}
+            else:
+                status, payload = client.get(parts[1])
+            body = json.dumps(payload).encode()
+            writer.write(
+                    'HTTP/1.1 {0} {1}\r\nContent-Type: application/json\r\n'
+                    'Content-Length: {2}\r\nConnection: close\r\n\r\n'
+                    .format(status, HTTP_REASONS.get(status, ''), len(body))
+                    .encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+    
+    async def serve():
+        server = await asyncio.start_server(handle, host, port)
+        print('Serving results of {0} on http://{1}:{2}'.format(
+                directory, host, port
+        ))
+        async with server:
+            await server.serve_forever()
+    
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+def run(config=None):
+    """Runs the complete analysis: market data loading (through the local 
+    market data cache), series reconstruction, portfolio generation, P&L, 
+    scenarios, VaR and ES (historic, filtered historic and EWMA), back-test
+    and summaries. Stage results are cached on disk (see stage_node)
+    ---------------------------------------------------------------------------
+    inputs:
+        config: Dictionary structure with the run configuration, overriding
+        DEFAULT_CONFIG (None by default)
+    outputs:
+        Tuple structure consisting of:
+            1. DataFrame structure with the KPI summary (see 
+            results_summary)
+            2. DataFrame structure with regulatory back-test statistics 
+            (see regulatory_tests)
+    ---------------------------------------------------------------------------
+    """
+    config = dict(DEFAULT_CONFIG, **({} if config is None else config))
+    home = os.path.dirname(os.path.abspath(__file__))
+    kernels.select(config['backend'])
+    index = config['index']
+    # unseeded runs draw (and report) a seed, so that their random
+    # portfolios are not reused from the stage cache by later runs
+    if config['seed'] is None:
+        config['seed'] = int(np.random.SeedSequence().entropy % 2**32)
+        print('Portfolio seed: {0}'.format(config['seed']))
+    source = None
+    if config['csv_dir'] is not None:
+        source = csv_source(os.path.join(home, config['csv_dir']))
+    store = price_store(os.path.join(home, config['market_data']), 
+                        source=source, offline=config['offline'])
+    
+    # index constituents: configured, scraped from wikipedia, or those in 
+    # the market data cache (offline) or in the CSV folder
+    tickers = config['tickers']
+    if tickers is None and config['offline']:
+        tickers = [t for t in store.tickers() if t != index]
+    elif tickers is None and source is not None:
+        tickers = [t for t in source.tickers() if t != index]
+    elif tickers is None:
+        tickers = scrape_wiki(config['wiki_url'])
+    
+    if config['out_of_core']:
+        return out_of_core_run(config, store, index, tickers)
+    
+    print('Loading Market Data')
+    data, failures = get_market_data(
+            [index] + list(tickers), align_to=index, store=store,
+            start=pd.Timestamp(config['start']), 
+            end=pd.Timestamp(config['end'])
+    )
+    for t in failures:
+        print('Unable to load {0}: {1!r}'.format(t, failures[t]))
+    if index in failures:
+        raise index_data_missing(
+                'Index market data is required for the analysis'
+        )
+    tickers = [t for t in tickers if t in data.columns]
+    if config['update']:
+        return update_run(config, data, index, tickers)
+    
+    # pipeline stages, as a lazy graph whose results are cached on disk 
+    # under a hash of their inputs and parameters (only stages affected by 
+    # changes in data, parameters or code are calculated again)
+    cache = stage_cache(os.path.join(home, config['stage_cache']), 
+                        config['cache_bytes'])
+    workers = {'workers': config['workers'] or os.cpu_count()}
+    window = config['window']
+    confidence = config['confidence']
+    
+    # series reconstruction
+    data = stage_node(series_reconstructor, data, index)
+
+    # generate random portfolios
+    portfolios = stage_node(portfolio_generator, data, index, tickers, 
+                            config['portfolios'], config['securities'], 
+                            config['seed'])
+        
+    # calculate historic P&L vectors for each portfolio
+    hist_pl = stage_node(pl_calculator, data, portfolios, config['horizon'])
+    
+    # identify scenarios, and implement VaR and ES for each portfolio 
+    # (portfolios distributed among worker processes)
+    scenarios = stage_node(parallel_calculator, scenario_identificator, 
+                           hist_pl, window, name='scenario_identificator', 
+                           untracked=workers)
+    var_es = stage_node(parallel_calculator, var_es_calculator, hist_pl, 
+                        window, confidence, name='var_es_calculator', 
+                        untracked=workers)
+    
+    # implement filtered historic and EWMA parametric VaR and ES, to be 
+    # compared with historic VaR and ES
+    fhs = stage_node(parallel_calculator, fhs_calculator, hist_pl, window, 
+                     confidence, name='fhs_calculator', untracked=workers)
+    ewma = stage_node(ewma_calculator, hist_pl, window, confidence)
+    
+    # back-test strategies
+    backtests = stage_node(backtester, scenarios, hist_pl, var_es[0], 
+                           var_es[1], models={'FHS': fhs, 'EWMA': ewma})
+    
+    # summarize results
+    summary = stage_node(results_summary, backtests).result(cache)
+    tests = stage_node(regulatory_tests, backtests, confidence).result(cache)
+    
+    # persist queryable results (unless already persisted for this graph)
+    results = result_store(os.path.join(home, config['results_dir']))
+    if results.key() != backtests.key:
+        results.save(backtests.result(cache), summary, tests, backtests.key)
+    monitor.save(os.path.join(home, config['report']))
+    return summary, tests
+
+
+def out_of_core_run(config, store, index, tickers):
+    """Runs the analysis for large universes (see run): market data, 
+    deltas and P&L are stored as memory-mapped float32 arrays on disk, and 
+    calculations stream over chunks of securities and portfolios
+    ---------------------------------------------------------------------------
+    inputs:
+        config: Dictionary structure with the run configuration
+        store: price_store object (market data cache)
+        index: ticker of the index
+        tickers: list of the index's constituents tickers
+    outputs:
+        Tuple structure with the KPI summary and regulatory back-test 
+        statistics (see run)
+    ---------------------------------------------------------------------------
+    """
+    home = os.path.dirname(os.path.abspath(__file__))
+    directory = os.path.join(home, config['memmap_dir'])
+    os.makedirs(directory, exist_ok=True)
+    chunk_size = config['chunk_size']
+    columns = [index] + [t for t in tickers if t != index]
+    
+    print('Loading Market Data')
+    dates, prices, failures = memmap_market_data(
+            columns, os.path.join(directory, 'prices.npy'), index, 
+            chunk_size, store=store, start=pd.Timestamp(config['start']), 
+            end=pd.Timestamp(config['end'])
+    )
+    for t in failures:
+        print('Unable to load {0}: {1!r}'.format(t, failures[t]))
+    if index in failures:
+        raise index_data_missing(
+                'Index market data is required for the analysis'
+        )
+    tickers = [t for t in columns[1 :] if t not in failures]
+    
+    weights = portfolio_generator(
+            pd.DataFrame(columns=columns), index, tickers, 
+            config['portfolios'], config['securities'], config['seed']
+    )
+    pl_dates, pl = memmap_pl_calculator(
+            prices, dates, columns, weights, directory, index, 
+            config['horizon'], chunk_size
+    )
+    summary, tests = chunked_backtester(
+            pl, pl_dates, weights.index, config['window'], 
+            config['confidence'], chunk_size
+    )
+    monitor.save(os.path.join(home, config['report']))
+    return summary, tests
+
+
+def update_run(config, data, index, tickers):
+    """Runs the daily update of the analysis (see run): the risk state saved
+    by the previous update is loaded, the days of P&L after its last day 
+    are calculated and appended to it (see risk_state) and the updated 
+    state is saved. Without a saved state (or if its window or confidence 
+    level changed), the state is calculated from the whole history. 
+    Regulatory back-test statistics are simulated over the whole history, 
+    and the persisted results are rewritten, on every update
+    ---------------------------------------------------------------------------
+    inputs:
+        config: Dictionary structure with the run configuration
+        data: DataFrame structure with market data (index and constituents)
+        index: ticker of the index
+        tickers: list of the index's constituents tickers
+    outputs:
+        Tuple structure with the KPI summary and regulatory back-test 
+        statistics (see run)
+    ---------------------------------------------------------------------------
+    """
+    home = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(home, config['state'])
+    window = config['window']
+    confidence = config['confidence']
+    state = None
+    if os.path.exists(path):
+        state = risk_state.load(path)
+        if ((state.window, state.confidence) != (window, confidence) 
+            or state.weights is None 
+            or not state.weights.columns.isin(data.columns).all()):
+            print('Saved risk state does not match the configuration')
+            state = None
+    
+    # portfolios of the saved state, or new random portfolios
+    if state is None:
+        weights = portfolio_generator(
+                data, index, tickers, config['portfolios'], 
+                config['securities'], config['seed']
+        )
+    else:
+        weights = state.weights
+    history = lambda sessions: pl_calculator(
+            series_reconstructor(sessions[weights.columns], index), 
+            weights, config['horizon']
+    )
+    if state is not None:
+        # only the sessions needed for the P&L of the state's last day and 
+        # of the days after it are reconstructed
+        last = state.cube.index[-1]
+        start = (data.index.get_loc(last) - config['horizon'] 
+                 if last in data.index else 0)
+        hist_pl = history(data.iloc[max(start, 0) :])
+        # P&L of the state's last day is the same unless market data or 
+        # P&L horizon changed
+        if (last not in hist_pl.index 
+            or not np.allclose(hist_pl.loc[last].values, state.cube.pl[-1],
+                               rtol=1e-9, atol=1e-12)):
+            print('Saved risk state does not match the market data')
+            state = None
+    
+    if state is None:
+        print()
+        print('Calculating risk state from the whole history')
+        hist_pl = history(data)
+        state = risk_state(hist_pl, window, confidence, weights=weights)
+    else:
+        new = hist_pl[hist_pl.index > state.cube.index[-1]]
+        print()
+        print('Appending {0} days to the risk state'.format(len(new)))
+        with monitor.stage('risk_state.update', len(new)):
+            for date, pl in zip(new.index, new.values):
+                state.update(date, pl)
+    state.save(path)
+    
+    summary = state.summary()
+    tests = regulatory_tests(state.cube, confidence)
+    result_store(os.path.join(home, config['results_dir'])).save(
+            state.cube, summary, tests
+    )
+    monitor.save(os.path.join(home, config['report']))
+    return summary, tests
+
+
+def main(argv=None):
+    """Command line entry point: runs the analysis with the configuration 
+    file and options provided, and displays its results
+    ---------------------------------------------------------------------------
+    inputs:
+        argv: list of command line arguments (sys.argv by default)
+    ---------------------------------------------------------------------------
+    """
+    parser = argparse.ArgumentParser(
+            description='Value-at-Risk (VaR) vs Expected Shortfall (ES)'
+    )
+    parser.add_argument('--config', 
+                        help='JSON file with the run configuration')
+    parser.add_argument('--offline', action='store_true', default=None,
+                        help='use the market data cache only')
+    parser.add_argument('--csv-dir', 
+                        help='folder of CSV market data files (<ticker>.csv)'
+                        ' used as market data source instead of Yahoo Finance')
+    parser.add_argument('--no-plots', dest='plots', action='store_false', 
+                        default=None, help='do not render the HTML report')
+    parser.add_argument('--quiet', action='store_true', default=None,
+                        help='do not display the summaries')
+    parser.add_argument('--backend', choices=kernel_backend.names,
+                        help='backend of the sequential kernels')
+    parser.add_argument('--workers', type=int, 
+                        help='number of worker processes')
+    parser.add_argument('--seed', type=int, 
+                        help='seed for portfolio generation')
+    parser.add_argument('--update', action='store_true', default=None,
+                        help='append the days after the saved risk state to '
+                        'it (daily update), instead of a full run')
+    parser.add_argument('--serve', action='store_true', 
+                        help='serve queries over the persisted results of '
+                        'a previous run, instead of running the analysis')
+    parser.add_argument('--port', type=int, help='port of the query service')
+    args = parser.parse_args(argv)
+    # folders given on the command line are relative to the working folder
+    if args.csv_dir is not None:
+        args.csv_dir = os.path.abspath(args.csv_dir)
+    config = {}
+    if args.config:
+        with open(args.config) as f:
+            config.update(json.load(f))
+    config.update({k: v for k, v in vars(args).items() 
+                   if k not in ('config', 'serve') and v is not None})
+    config = dict(DEFAULT_CONFIG, **config)
+    if args.serve:
+        home = os.path.dirname(os.path.abspath(__file__))
+        query_service(os.path.join(home, config['results_dir']), 
+                      config['host'], config['port'])
+        return
+    
+    print('Volatility and Risk - '
+          'Value-at-Risk (VaR) vs Expected Shortfall (ES)'
+          )
+    print()
+    
+    # progress display only for interactive sessions (not batch jobs)
+    progress_bar.enabled = sys.stderr.isatty()
+    try:
+        summary, tests = run(config)
+    except index_data_missing as e:
+        sys.exit(e.args[0])
+    portfolios = summary.columns.get_level_values(0).unique()
+    if not config['quiet']:
+        print()
+        print('Summarized results of VaR and ES back-testing:')
+        for p in portfolios:
+            print()
+            print(p)
+            print(summary[p])
+            print(tests[p])
+
+    if config['plots']:
+        home = os.path.dirname(os.path.abspath(__file__))
+        path = report_generator(
+                summary, tests, os.path.join(home, config['report_dir']), 
+                config['formats'], config['workers']
+        )
+        print('Report written to {0}'.format(path))
+
+
+### Support Functions ###
+
+def scenario_labeler(df, boom_thresholds, pos_thresholds, 
+                     neg_thresholds, stress_thresholds):
+    """Implements logic for scenario labeling based on portfolio's historic 
+    returns and defined thresholds for scenario types
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with portfolio's historic n-day window returns
+        boom_thresholds: DataFrame structure with threshold values for 
+        'Boom' scenarios, for each portfolio
+        pos_thresholds: DataFrame structure with threshold values for 
+        'Positive' scenarios, for each portfolio
+        neg_thresholds: DataFrame structure with threshold values for 
+        'Negative' scenarios, for each portfolio
+        stress_thresholds: DataFrame structure with threshold values for 
+        'Stressed' scenarios, for each portfolio
+    outputs:
+        DataFrame structure consisting of scenario labels for each portfolio 
+        and daily moving window:
+            labels:
+                1. 'Boom': window's return is beyond two positive standard 
+                deviations from average returns - 2% of scenaarios (approx)
+                2. 'Positive': window's return is between one and two positive 
+                standard deviations from average returns - 14% scenarios 
+                (approx)
+                3. 'Neutral': window's return is within one standard deviation
+                (either positive or negative) from average returns - 68% 
+                scenarios (approx)
+                4. 'Negative': window's return is between one and two negative
+                standard deviations from average returns - 14% scenarios 
+                (approx)
+                5. 'Stressed': window's return is beyond two negative standard 
+                deviations from average returns - 2% of scenaarios (approx)
+    ---------------------------------------------------------------------------
+    """    
+    print()
+    print ('Classifying historic scenarios for each portfolio')    
+    # for each portfolio, define scenario type threshold and implement 
+    # scenario label logic
+    codes = scenario_codes(
+            df.values.astype(float), 
+            boom_thresholds[df.columns].values,
+            pos_thresholds[df.columns].values,
+            neg_thresholds[df.columns].values,
+            stress_thresholds[df.columns].values
+    )
+    labels = pd.DataFrame(
+            {p: pd.Categorical.from_codes(codes[:, j], SCENARIOS) 
+             for j, p in enumerate(df.columns)},
+            index=df.index
+    )
+    return labels
+
+
+def window_means(df, window):
+    """Calculates the average return of the rolling window preceding each 
+    day, as the difference of cumulative sums at both ends of the window
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant P&L data (deltas) for each
+        portfolio
+        window: size of the window (number of days) to be analyzed 
+    outputs:
+        DataFrame structure with the average return of each day's window, 
+        for days with sufficient past data to fill the window
+    ---------------------------------------------------------------------------
+    """
+    values = df.values.astype(float)
+    cumsum = np.concatenate(
+            [np.zeros((1, values.shape[1])), np.cumsum(values, axis=0)]
+    )
+    return pd.DataFrame(
+            (cumsum[window : -1] - cumsum[: -window-1]) / window,
+            index=df.index[window :],
+            columns=df.columns
+    )
+
+
+def scenario_thresholds(df):
+    """Defines scenario thresholds for each portfolio, based on the 
+    dispersion of its historical average window returns
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure (or array structure) with portfolio's 
+        historic n-day window returns, without missing values
+    outputs:
+        Tuple structure with 'Boom', 'Positive', 'Negative' and 'Stressed'
+        threshold values (Series structures, or arrays for an array 
+        structure) for each portfolio
+    ---------------------------------------------------------------------------
+    """
+    # row-major values, so that the sums (and thresholds) of the daily 
+    # update (see risk_state) are the same, bit by bit
+    values = np.ascontiguousarray(df, dtype=float)
+    mean = values.mean(axis=0)
+    std = values.std(axis=0, ddof=1)
+    thresholds = mean + std*2, mean + std, mean - std, mean - std*2
+    if isinstance(df, pd.DataFrame):
+        return tuple(pd.Series(t, index=df.columns) for t in thresholds)
+    return thresholds
+
+
+def scenario_codes(values, boom, pos, neg, stress):
+    """Implements scenario label logic on arrays, returning each label as its
+    position (code) in SCENARIOS
+    ---------------------------------------------------------------------------
+    inputs:
+        values: array structure with portfolio's historic n-day window 
+        returns (days x portfolios)
+        boom, pos, neg, stress: array structures with threshold values for 
+        'Boom', 'Positive', 'Negative' and 'Stressed' scenarios, for each 
+        portfolio
+    outputs:
+        int8 array structure with the scenario code of each value
+    ---------------------------------------------------------------------------
+    """
+    # first matching condition defines the label, 'Neutral' otherwise
+    conditions = [values >= boom, values >= pos, values <= stress, 
+                  values <= neg]
+    return np.select(conditions, [0, 1, 4, 3], default=2).astype(np.int8)
+
+
+def yahoo_source(ticker, start, end):
+    """Market data source downloading the ticker's Adjusted Close series 
+    from Yahoo Finance
+    ---------------------------------------------------------------------------
+    inputs:
+        ticker: str type representing the security's symbol in the market
+        start: first session of the requested period
+        end: last session of the requested period
+    outputs:
+        Series structure with the Adjusted Close of every session between 
+        start and end date
+    ---------------------------------------------------------------------------
+    """
+    import pandas_datareader.data as web
+    import fix_yahoo_finance as fix
+    
+    # yahoo finance override
+    fix.pdr_override ()
+    data = web.DataReader (ticker, 'yahoo', start, end)
+    return data['Adj Close']
+
+
+def retry_call(function, args=(), kwargs=None, max_attempts=5, 
+               backoff=1.0, permanent=None):
+    """Calls function with the provided arguments, retrying with exponential 
+    backoff until it succeeds or the maximum number of attempts is reached
+    ---------------------------------------------------------------------------
+    inputs:
+        function: callable to be executed
+        args: tuple of positional arguments for the function
+        kwargs: dictionary of keyword arguments for the function
+        max_attempts: maximum number of attempts (5 by default)
+        backoff: waiting time (seconds) before the first retry, doubled 
+        after each failed attempt (1 second by default)
+        permanent: exception types of failures that would not succeed on a
+        retry, propagated at once (market_data_missing by default: tickers 
+        missing from the market data cache or a local source)
+    outputs:
+        Value returned by the function. The exception raised by the last 
+        attempt is propagated if all attempts fail
+    ---------------------------------------------------------------------------
+    """
+    kwargs = {} if kwargs is None else kwargs
+    permanent = (market_data_missing,) if permanent is None else permanent
+    for attempt in range(max_attempts):
+        try:
+            return function(*args, **kwargs)
+        except permanent:
+            raise
+        except Exception:
+            if attempt + 1 >= max_attempts:
+                raise
+            time.sleep(backoff * 2**attempt)
+
+
+def ewma_volatility(df, window=500, decay=0.94):
+    """Calculates the EWMA (RiskMetrics) volatility forecast of each day, 
+    with the recursive filter: 
+        variance(t) = decay*variance(t-1) + (1-decay)*return(t-1)^2
+    for all portfolios at once, seeded with the average squared return of 
+    the first window
+    ---------------------------------------------------------------------------
+    inputs:
+        df: DataFrame structure with all relevant P&L data (deltas) for each
+        portfolio
+        window: number of days used to seed the filter (500 by default)
+        decay: EWMA decay factor (0.94 by default - RiskMetrics)
+    outputs:
+        DataFrame structure with each day's volatility, based on returns 
+        up to the previous day
+    ---------------------------------------------------------------------------
+    """
+    variance = ewma_variance(df.values, window, decay)
+    return pd.DataFrame(
+            np.sqrt(variance[: -1]), index=df.index, columns=df.columns
+    )
+
+
+def ewma_variance(values, window=500, decay=0.94):
+    """Calculates the EWMA variance filter (see ewma_volatility) day by day,
+    for all portfolios at once, with the same step (see ewma_step) as the 
+    daily update of the risk state
+    ---------------------------------------------------------------------------
+    inputs:
+        values: array structure with daily P&L data (days x portfolios)
+        window: number of days used to seed the filter (500 by default)
+        decay: EWMA decay factor (0.94 by default - RiskMetrics)
+    outputs:
+        Array structure (days + 1 x portfolios) with the variance forecast 
+        of each day, followed by the forecast for the day after the last one
+    ---------------------------------------------------------------------------
+    """
+    squares = np.asarray(values, dtype=float)**2
+    variance = np.empty((len(squares) + 1,) + squares.shape[1 :])
+    variance[0] = squares[: window].mean(axis=0)
+    for t in range(len(squares)):
+        variance[t + 1] = ewma_step(variance[t], squares[t], decay)
+    return variance
+
+
+def ewma_step(variance, square, decay=0.94):
+    """Updates the EWMA variance forecast with a day's squared return"""
+    return decay*variance + (1 - decay)*square
+
+
+def block_bootstrap_positions(rng, n, simulations, window, block):
+    """Generates resampling positions of a (circular) moving block 
+    bootstrap: each resample concatenates blocks of consecutive days 
+    starting at random positions of the window
+    ---------------------------------------------------------------------------
+    inputs:
+        rng: numpy random Generator
+        n: number of windows to be resampled
+        simulations: number of resamples of each window
+        window: size of the window (number of days)
+        block: number of consecutive days of each block
+    outputs:
+        3-D array structure (windows x simulations x window) with the 
+        positions of the window days drawn for each resample
+    ---------------------------------------------------------------------------
+    """
+    n_blocks = -(-window // block)
+    starts = rng.integers(0, window, (n, simulations, n_blocks))
+    positions = (starts[..., np.newaxis] + np.arange(block)) % window
+    return positions.reshape(n, simulations, n_blocks * block)[..., : window]
+
+
+def stationary_bootstrap_positions(rng, n, days, block):
+    """Generates resampling positions of a (circular) stationary bootstrap:
+    each resample starts a new block at a random day with probability 
+    1 / block, and otherwise continues with the following day
+    ---------------------------------------------------------------------------
+    inputs:
+        rng: numpy random Generator
+        n: number of resamples
+        days: number of days of the series
+        block: average number of consecutive days of each block
+    outputs:
+        2-D array structure (resamples x days) with the positions of the 
+        days drawn for each resample
+    ---------------------------------------------------------------------------
+    """
+    new_block = rng.random((n, days)) < 1 / block
+    new_block[:, 0] = True
+    starts = rng.integers(0, max(days, 1), (n, days))
+    t = np.arange(days)
+    # day at which the current block started, and its starting position
+    block_day = np.maximum.accumulate(np.where(new_block, t, 0), axis=1)
+    block_start = np.take_along_axis(starts, block_day, axis=1)
+    return (block_start + t - block_day) % max(days, 1)
+
+
+def append_row(buffer, n, row):
+    """Writes a row after the first n rows of an array with spare rows, 
+    replacing it by a larger array (with 1/8 more rows, and at least 256 
+    spare rows) when it is full, so that appending rows one by one does not
+    copy the previous rows every time
+    ---------------------------------------------------------------------------
+    inputs:
+        buffer: array structure with n rows in use
+        n: number of rows in use
+        row: values of the new row
+    outputs:
+        Array structure with the new row at position n (the same array, or
+        a larger copy)
+    ---------------------------------------------------------------------------
+    """
+    if len(buffer) <= n:
+        buffer = reserve_rows(buffer, n, n + max(n // 8, 256))
+    buffer[n] = row
+    return buffer
+
+
+def reserve_rows(array, n, rows):
+    """Returns an array with room for the provided number of rows, holding
+    the first n rows of array (array itself if it is large enough)"""
+    if len(array) >= rows:
+        return array
+    grown = np.empty((rows,) + array.shape[1 :], dtype=array.dtype)
+    grown[: n] = array[: n]
+    return grown
+
+
+def backtest_aggregates(scenario, pl, values):
+    """Calculates the back-test aggregates from which the KPI summary is 
+    obtained, for each scenario and portfolio. Aggregates can be updated 
+    day by day (see risk_state)
+    ---------------------------------------------------------------------------
+    inputs:
+        scenario: int8 array structure with scenario codes (days x 
+        portfolios, -1 for missing labels)
+        pl: array structure with daily P&L data (days x portfolios)
+        values: Dictionary structure with array structures of daily 
+        calculations for each risk metric ('VaR', 'ES', 'VaR - <model>'...)
+    outputs:
+        Dictionary structure with the following arrays, for each metric:
+            ('KOs', metric): number of KO days (scenarios x portfolios)
+            ('Excess', metric): maximum loss in excess of the metric 
+            (scenarios x portfolios, inf if no KO days)
+            ('Period', metric): maximum number of consecutive KO days
+            (scenarios x portfolios, -1 for scenarios never observed)
+            ('Run', metric): number of consecutive KO days up to the last
+            day (portfolios)
+    ---------------------------------------------------------------------------
+    """
+    # a day is only reported if none of its values are missing
+    complete = (scenario >= 0) & ~np.isnan(pl)
+    for metric_values in values.values():
+        complete &= ~np.isnan(metric_values)
+    in_scenario = [scenario == i for i in range(len(SCENARIOS))]
+    aggregates = {}
+    for metric, metric_values in values.items():
+        # KO days: P&L value inferior to metric value (back-test False), 
+        # and number of consecutive KO days up to each day
+        flags = metric_values < pl
+        ko = ~flags & complete
+        ko_periods = ko_period_calculator(flags)
+        excess = pl - metric_values
+        aggregates['KOs', metric] = np.stack(
+                [(ko & mask).sum(axis=0) for mask in in_scenario]
+        )
+        aggregates['Excess', metric] = np.stack(
+                [np.where(ko & mask, excess, np.inf).min(
+                        axis=0, initial=np.inf
+                 ) for mask in in_scenario]
+        )
+        aggregates['Period', metric] = np.stack(
+                [np.where(mask, ko_periods, -1).max(axis=0, initial=-1) 
+                 for mask in in_scenario]
+        )
+        aggregates['Run', metric] = (
+                ko_periods[-1] if len(ko_periods) 
+                else np.zeros(pl.shape[1], dtype=int)
+        )
+    return aggregates
+
+
+def summary_matrix(aggregates, n_obs, portfolios):
+    """Creates the KPI summary DataFrame structure from back-test aggregates
+    ---------------------------------------------------------------------------
+    inputs:
+        aggregates: Dictionary structure with back-test aggregates (see 
+        backtest_aggregates)
+        n_obs: total number of observations (days)
+        portfolios: index of portfolios
+    outputs:
+        DataFrame structure with KPIs for each portfolio and scenario (see 
+        results_summary)
+    ---------------------------------------------------------------------------
+    """
+    metrics = [metric for name, metric in aggregates if name == 'KOs']
+    kpis = {}
+    for metric in metrics:
+        kpis['% KOs - ' + metric] = aggregates['KOs', metric] / n_obs*100
+        excess = aggregates['Excess', metric]
+        kpis['Max Excess Loss - ' + metric] = np.where(
+                np.isposinf(excess), np.nan, excess
+        )
+        period = aggregates['Period', metric]
+        kpis['Max Period KO - ' + metric] = np.where(
+                period < 0, np.nan, period
+        )
+    index = [kpi + ' - ' + metric for kpi in KPIS for metric in metrics]
+    return pd.DataFrame(
+            [kpis[k].T.ravel() for k in index],
+            index=index,
+            columns=pd.MultiIndex.from_product([portfolios, SCENARIOS])
+    )
+
+
+def coverage_tests(ko, complete, masks, alpha):
+    """Calculates VaR coverage tests (Kupiec POF, Christoffersen 
+    independence and conditional coverage) and Basel traffic light zones,
+    for each scenario mask and portfolio
+    ---------------------------------------------------------------------------
+    inputs:
+        ko: boolean array structure with KO days (days x portfolios)
+        complete: boolean array structure with days with no missing values
+        masks: list of boolean array structures with each scenario's days
+        alpha: expected ratio of KO days (1 - confidence)
+    outputs:
+        Dictionary structure with arrays (masks x portfolios) of p-values 
+        (or zone codes) for each test of VAR_TESTS
+    ---------------------------------------------------------------------------
+    """
+    masks = np.stack(masks)
+    n = masks.sum(axis=1)
+    x = (ko & masks).sum(axis=1)
+    ratio = x / np.where(n > 0, n, np.nan)
+    pof = -2 * (xlogy(n - x, 1 - alpha) + xlogy(x, alpha) 
+                - xlogy(n - x, 1 - ratio) - xlogy(x, ratio))
+    
+    # transitions between consecutive days, both without missing values 
+    # (counted on the scenario of the second day)
+    pairs = masks[:, 1 :] & complete[: -1]
+    prev, cur = ko[: -1], ko[1 :]
+    n00 = (pairs & ~prev & ~cur).sum(axis=1)
+    n01 = (pairs & ~prev & cur).sum(axis=1)
+    n10 = (pairs & prev & ~cur).sum(axis=1)
+    n11 = (pairs & prev & cur).sum(axis=1)
+    ratio_0 = n01 / np.maximum(n00 + n01, 1)
+    ratio_1 = n11 / np.maximum(n10 + n11, 1)
+    ratio = (n01 + n11) / np.maximum(n00 + n01 + n10 + n11, 1)
+    independence = -2 * (
+            xlogy(n00 + n10, 1 - ratio) + xlogy(n01 + n11, ratio)
+            - xlogy(n00, 1 - ratio_0) - xlogy(n01, ratio_0)
+            - xlogy(n10, 1 - ratio_1) - xlogy(n11, ratio_1)
+    )
+    independence = np.where(n > 1, independence, np.nan)
+    
+    # traffic light zones: cumulative probability of the number of KO days
+    # below 95% (green), below 99.99% (yellow) or above (red)
+    probability = binomial_cdf(x, n, alpha)
+    zone = np.where(probability < 0.95, 0, 
+                    np.where(probability < 0.9999, 1, 2)).astype(float)
+    return {'Kupiec POF': np.where(n > 0, chi2_sf(pof, 1), np.nan),
+            'Christoffersen Independence': chi2_sf(independence, 1),
+            'Christoffersen Conditional Coverage': chi2_sf(
+                    pof + independence, 2
+            ),
+            'Traffic Light': np.where(n > 0, zone, np.nan)}
+
+
+def acerbi_szekely_tests(pl, var, es, codes, alpha, simulations=1000, 
+                         batch=64, seed=0, memory=2**26, keys=None):
+    """Calculates Acerbi-Szekely ES back-test statistics (Z1: ES tested 
+    on VaR KO days; Z2: ES and VaR tested jointly) and their p-values, for 
+    each scenario and portfolio. P-values are simulated under the null 
+    hypothesis: VaR KO days occur independently with probability alpha, and
+    losses beyond VaR are exponentially distributed with mean ES (so that 
+    both VaR and ES forecasts are exact)
+    ---------------------------------------------------------------------------
+    inputs:
+        pl: array structure with daily P&L data (days x portfolios)
+        var: array structure with daily VaR values (days x portfolios)
+        es: array structure with daily ES values (days x portfolios)
+        codes: int8 array structure with scenario codes (-1 for days with 
+        missing values)
+        alpha: expected ratio of VaR KO days (1 - confidence)
+        simulations: number of simulations (1000 by default)
+        batch: number of portfolios simulated at once
+        seed: seed of the random number streams (0 by default)
+        memory: approximate maximum size (bytes) of the simulated values 
+        processed at once
+        keys: integer keys of each portfolio's random number streams 
+        (column positions by default), so that a portfolio's p-values do 
+        not depend on the other portfolios tested with it
+    outputs:
+        Dictionary structure with arrays (scenarios + all x portfolios) for
+        each test of ES_TESTS
+    ---------------------------------------------------------------------------
+    """
+    n_days, n_portfolios = pl.shape
+    masks = np.stack([codes == i for i in range(len(SCENARIOS))] 
+                     + [codes >= 0])
+    n = masks.sum(axis=1)
+    valid = codes >= 0
+    ko = valid & ~(var < pl)
+    # P&L values relative to ES (1 on average on VaR KO days)
+    relative = np.where(ko, pl / np.where(valid, es, 1), 0.)
+    exceptions = (ko & masks).sum(axis=1)
+    tail = (relative * masks).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z1 = np.where(exceptions > 0, 1 - tail / exceptions, np.nan)
+        z2 = np.where(n > 0, 1 - tail / (n * alpha), np.nan)
+    
+    # KO days are simulated through geometric gaps between them (enough 
+    # gaps to cover all days, with overwhelming probability)
+    expected = n_days * alpha
+    gaps = int(math.ceil(expected + 8 * math.sqrt(expected) + 10))
+    ratio = np.where(valid, var / np.where(valid, es, 1), 1.).T
+    codes = codes.T
+    z1_below = np.zeros(z1.shape)
+    z1_count = np.zeros(z1.shape)
+    z2_below = np.zeros(z2.shape)
+    step = max(1, memory // (batch * gaps * 8 * 4))
+    
+    keys = range(n_portfolios) if keys is None else keys
+    progress = progress_bar(max(n_portfolios, 1), fmt=progress_bar.full)
+    for b in range(0, n_portfolios, batch):
+        p = slice(b, min(b + batch, n_portfolios))
+        columns = np.arange(p.start, p.stop)[:, np.newaxis]
+        # separate streams for gaps and losses of each portfolio, so that 
+        # results depend neither on the number of simulations processed at 
+        # once nor on the batch of portfolios
+        streams = [
+                [np.random.default_rng(s) for s in np.random.SeedSequence(
+                        seed, spawn_key=(int(key),)
+                ).spawn(2)]
+                for key in keys[p]
+        ]
+        for start in range(0, simulations, step):
+            shape = (min(step, simulations - start), gaps)
+            days = np.cumsum(np.stack(
+                    [rng_gaps.geometric(alpha, shape) 
+                     for rng_gaps, _ in streams], axis=1
+            ), axis=-1) - 1
+            inside = days < n_days
+            days = np.minimum(days, n_days - 1)
+            sim_ratio = ratio[columns, days]
+            sim_codes = np.where(inside, codes[columns, days], -1)
+            # simulated P&L relative to ES on KO days
+            sim_relative = sim_ratio + (1 - sim_ratio) * np.stack(
+                    [rng_losses.standard_exponential(shape) 
+                     for _, rng_losses in streams], axis=1
+            )
+            for i in range(len(SCENARIOS) + 1):
+                in_mask = (sim_codes == i if i < len(SCENARIOS) 
+                           else sim_codes >= 0)
+                sim_exceptions = in_mask.sum(axis=-1)
+                sim_tail = (sim_relative * in_mask).sum(axis=-1)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    sim_z1 = 1 - sim_tail / sim_exceptions
+                    sim_z2 = 1 - sim_tail / (n[i, p] * alpha)
+                z1_below[i, p] += (
+                        (sim_z1 <= z1[i, p]) & (sim_exceptions > 0)
+                ).sum(axis=0)
+                z1_count[i, p] += (sim_exceptions > 0).sum(axis=0)
+                z2_below[i, p] += (sim_z2 <= z2[i, p]).sum(axis=0)
+        progress.current = p.stop
+        progress()
+    progress.done()
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {'Z1': z1, 
+                'Z1 p-value': np.where(np.isnan(z1), np.nan, 
+                                       z1_below / z1_count),
+                'Z2': z2,
+                'Z2 p-value': np.where(np.isnan(z2), np.nan, 
+                                       z2_below / simulations)}
+
+
+def content_hash(value, digest=None):
+    """Calculates a hash of the content of a stage input or parameter 
+    (DataFrame and array values, collections, functions and stage nodes)
+    ---------------------------------------------------------------------------
+    inputs:
+        value: value to be hashed
+        digest: hashlib object to be updated (new sha256 by default)
+    outputs:
+        Hexadecimal string with the hash of the value
+    ---------------------------------------------------------------------------
+    """
+    h = hashlib.sha256() if digest is None else digest
+    h.update(type(value).__name__.encode())
+    if isinstance(value, stage_node):
+        h.update(value.key.encode())
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        h.update(pd.util.hash_pandas_object(value, index=True).values)
+        if isinstance(value, pd.DataFrame):
+            h.update(repr(list(value.columns)).encode())
+            h.update(repr(list(value.dtypes)).encode())
+        else:
+            h.update(repr((value.name, value.dtype)).encode())
+    elif isinstance(value, np.ndarray):
+        h.update(repr((value.dtype, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        h.update(str(len(value)).encode())
+        for v in value:
+            content_hash(v, h)
+    elif isinstance(value, dict):
+        h.update(str(len(value)).encode())
+        for k in sorted(value, key=repr):
+            content_hash(k, h)
+            content_hash(value[k], h)
+    elif callable(value):
+        # functions are identified by name and by the source of their 
+        # module, so that cached results are invalidated by code changes
+        module = sys.modules.get(getattr(value, '__module__', None))
+        path = getattr(module, '__file__', None)
+        h.update('{0}.{1}'.format(
+                getattr(value, '__module__', None), 
+                getattr(value, '__qualname__', repr(value))
+        ).encode())
+        if path is not None:
+            with open(path, 'rb') as f:
+                h.update(f.read())
+    else:
+        h.update(repr(value).encode())
+    return h.hexdigest()
+
+
+def memmap_array(path, shape, dtype=np.float32):
+    """Creates column-major memory-mapped array file (NumPy .npy format). 
+    An existing file is removed rather than overwritten, so that arrays 
+    still mapped from it remain valid
+    ---------------------------------------------------------------------------
+    inputs:
+        path: path of the array file
+        shape: shape of the array
+        dtype: floating point type of the array (float32 by default)
+    outputs:
+        Memory-mapped array structure (filled with zeros)
+    ---------------------------------------------------------------------------
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, 
+                                     shape=shape, fortran_order=True)
+
+
+def chart_worker(series, title, paths):
+    """Renders a KPI chart (a line per portfolio across scenarios) on an 
+    Agg canvas, without pyplot (so that the caller's matplotlib backend is 
+    left unchanged), and saves it in each of the paths' formats
+    ---------------------------------------------------------------------------
+    inputs:
+        series: Series structure with a KPI for each portfolio and scenario
+        title: title of the chart
+        paths: list of image file paths (formats given by their extension)
+    ---------------------------------------------------------------------------
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    for p in series.index.get_level_values(0).unique():
+        ax.plot(np.arange(len(series[p])), series[p].values, label=p)
+    ax.set_title(title)
+    ax.set_xticks(range(len(SCENARIOS)))
+    ax.set_xticklabels(SCENARIOS)
+    ax.legend(loc='center left', bbox_to_anchor=(1, 0.5), fontsize='small')
+    for path in paths:
+        fig.savefig(path, bbox_inches='tight')
+
+
+def report_html(summary, tests, charts):
+    """Creates static HTML report with the KPI charts and summary tables
+    ---------------------------------------------------------------------------
+    inputs:
+        summary: DataFrame structure with the KPI summary
+        tests: DataFrame structure with regulatory back-test statistics (or
+        None)
+        charts: list of (title, image file name) tuples
+    outputs:
+        str type HTML document
+    ---------------------------------------------------------------------------
+    """
+    import html
+    
+    figures = ''.join(
+            '<figure><img src="{1}" alt="{0}"><figcaption>{0}</figcaption>'
+            '</figure>\n'.format(html.escape(title), html.escape(path))
+            for title, path in charts
+    )
+    tables = '<h2>Back-test KPIs</h2>\n' + summary.to_html()
+    if tests is not None:
+        tables += '\n<h2>Regulatory back-tests</h2>\n' + tests.to_html()
+    return (
+            '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+            '<title>VaR vs ES back-test report</title>\n<style>\n'
+            'body {{font-family: sans-serif; margin: 2em;}}\n'
+            'figure {{display: inline-block; margin: 0.5em;}}\n'
+            'img {{max-width: 480px;}}\n'
+            'table {{border-collapse: collapse; font-size: 0.8em;}}\n'
+            'td, th {{border: 1px solid #ccc; padding: 2px 6px;}}\n'
+            '</style>\n</head>\n<body>\n'
+            '<h1>Value-at-Risk (VaR) vs Expected Shortfall (ES)</h1>\n'
+            '<p>Generated {0}</p>\n<h2>KPI charts</h2>\n{1}{2}\n'
+            '</body>\n</html>\n'
+    ).format(dt.datetime.now().strftime('%Y-%m-%d %H:%M'), figures, tables)
+
+
+def json_values(values):
+    """Converts array structure to list of floats for JSON documents (None 
+    for missing values)
+    """
+    return [None if v != v else v for v in np.asarray(values, float).tolist()]
+
+
+def xlogy(x, y):
+    """Calculates x * log(y), with 0 for x = 0 (vectorized)
+    """
+    x = np.asarray(x, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(x == 0, 0., x * np.log(y))
+
+
+def chi2_sf(x, df):
+    """Calculates chi-squared survival function (p-values of likelihood 
+    ratio tests) for 1 or 2 degrees of freedom, without depending on scipy
+    ---------------------------------------------------------------------------
+    inputs:
+        x: array structure with test statistics (nan for undefined tests)
+        df: degrees of freedom (1 or 2)
+    outputs:
+        Array structure with p-values
+    ---------------------------------------------------------------------------
+    """
+    x = np.maximum(np.asarray(x, dtype=float), 0)
+    if df == 1:
+        return np.frompyfunc(math.erfc, 1, 1)(np.sqrt(x / 2)).astype(float)
+    if df == 2:
+        return np.exp(-x / 2)
+    raise ValueError('chi2_sf only supports 1 or 2 degrees of freedom')
+
+
+def binomial_cdf(x, n, p):
+    """Calculates binomial cumulative distribution function (vectorized, in
+    log space to avoid underflow for long histories)
+    ---------------------------------------------------------------------------
+    inputs:
+        x: integer array structure with numbers of successes
+        n: integer array structure with numbers of trials
+        p: probability of success
+    outputs:
+        Array structure with the probability of up to x successes
+    ---------------------------------------------------------------------------
+    """
+    x = np.asarray(x)
+    n = np.asarray(n, dtype=float)
+    log_pmf = n * math.log1p(-p)
+    cdf = np.exp(log_pmf)
+    for k in range(int(x.max(initial=0))):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_pmf = log_pmf + (np.log(n - k) - math.log(k + 1) 
+                                 + math.log(p / (1 - p)))
+        cdf = cdf + np.where(k + 1 <= x, np.exp(log_pmf), 0.)
+    return np.minimum(cdf, 1.)
+
+
+def window_order_statistics(values, window, ranks, chunk_size=None, 
+                            tail_mean=False):
+    """Calculates order statistics (ascending ranks) of every rolling window 
+    of the provided values, for all columns at once. Windows are batched as 
+    strided views and partially sorted up to the highest rank, instead of 
+    fully sorting a copy of each window; only the tail below it is sorted, 
+    and shared by all ranks (e.g. several confidence levels)
+    ---------------------------------------------------------------------------
+    inputs:
+        values: 2-D array structure (days x portfolios) with P&L data
+        window: size of the window (number of days) to be analyzed
+        ranks: list of ascending positions to be obtained from each window
+        (0 being the lowest value)
+        chunk_size: number of daily windows processed per batch (sized 
+        automatically by default, to bound memory usage)
+        tail_mean: if True, the average of the values below each rank is 
+        also obtained from the same partially sorted windows (False by 
+        default)
+    outputs:
+        3-D array structure (ranks x windows x portfolios) with the order 
+        statistics of the windows preceding each day from 'window' onwards.
+        If tail_mean is True, tuple structure with the order statistics and
+        a 3-D array structure of the same shape with the tail averages
+    ---------------------------------------------------------------------------
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    n_windows = max(len(values) - window, 0)
+    output = np.empty((len(ranks), n_windows, values.shape[1]))
+    tails = np.full(output.shape, np.nan)
+    if chunk_size is None:
+        chunk_size = max(1, 2**22 // (window * values.shape[1]))
+    
+    # strided view (windows x portfolios x window days), without copying
+    windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)
+    kth = max(ranks)
+    progress = progress_bar(max(n_windows, 1), fmt=progress_bar.full)
+    for start in range(0, n_windows, chunk_size):
+        stop = min(start + chunk_size, n_windows)
+        # after partitioning, the values up to the highest rank are the 
+        # lowest values of the window (the tail), in no particular order; 
+        # the tail is sorted so that every rank, and the average of the 
+        # values below it, are obtained from it (sorted before averaging so 
+        # the result does not depend on the partitioning, same as in the 
+        # incremental risk_state)
+        block = np.partition(windows[start : stop], kth, axis=-1)
+        tail = np.sort(block[..., : kth + 1], axis=-1)
+        output[:, start : stop] = np.moveaxis(tail[..., ranks], -1, 0)
+        if tail_mean:
+            for j, r in enumerate(ranks):
+                if r > 0:
+                    tails[j, start : stop] = tail[..., : r].mean(axis=-1)
+        progress.current = stop
+        progress()
+    progress.done()
+    if tail_mean:
+        return output, tails
+    return output
+
+
+def ordered_window_update(ordered, old, new):
+    """Slides ordered (sorted) windows by one day for all portfolios at 
+    once: the value leaving each window is removed and the new value is 
+    inserted in its sorted position
+    ---------------------------------------------------------------------------
+    inputs:
+        ordered: 2-D array structure (portfolios x window) with each 
+        portfolio's window values in ascending order
+        old: array structure with the value leaving each window
+        new: array structure with the value entering each window
+    outputs:
+        2-D array structure with the updated ordered windows
+    ---------------------------------------------------------------------------
+    """
+    kernel = kernels.get('ordered_update')
+    if kernel is not None:
+        return kernel(ordered, old, new)
+    n, window = ordered.shape
+    rows = np.arange(n)
+    # remove the first occurrence of each leaving value
+    keep = np.ones(ordered.shape, dtype=bool)
+    keep[rows, (ordered < old[:, np.newaxis]).sum(axis=1)] = False
+    rest = ordered[keep].reshape(n, window - 1)
+    # shift values above the insertion position and insert the new values
+    insert = (rest < new[:, np.newaxis]).sum(axis=1)
+    positions = np.arange(window) - (
+            np.arange(window) > insert[:, np.newaxis]
+    )
+    updated = np.take_along_axis(
+            rest, np.minimum(positions, window - 2), axis=1
+    )
+    updated[rows, insert] = new
+    return updated
+
+
+def ko_period_calculator(series):
+    """Calculates number of consecutive KO days for metric
+    ---------------------------------------------------------------------------
+    inputs:
+        series: vector (or 2-D array structure, days x portfolios) of 
+        boolean values consisting of metric's back-test, where:
+            1. 'True': P&L value is inferior to metric value (metric KO)
+            2. 'False': P&L value is superior to metric value (metric OK)
+    outputs:
+        Array structure (same shape as series) with consecutive KO values
+    ---------------------------------------------------------------------------
+    """
+    # run-length encoding of consecutive KO values: distance from each day
+    # to the last day that was not a KO (counter is reset on those days)
+    series = np.asarray(series)
+    if series.dtype == bool:
+        ko = ~series
+    else:
+        ko = np.equal(series.astype(object), False)
+    kernel = kernels.get('ko_periods')
+    if kernel is not None:
+        return kernel(ko.reshape(len(ko), -1)).reshape(ko.shape)
+    days = np.arange(len(ko)).reshape((-1,) + (1,)*(ko.ndim-1))
+    last_reset = np.maximum.accumulate(np.where(ko, -1, days), axis=0)
+    return days - last_reset
+
+
+
+def ko_periods_at(flags, days, columns):
+    """Calculates the number of consecutive KO days up to single cells of a
+    back-test array (see ko_period_calculator), counting backwards only as 
+    far as each cell's KO period goes
+    ---------------------------------------------------------------------------
+    inputs:
+        flags: boolean array structure with the metric's back-test (days x
+        portfolios, 'True' if OK)
+        days: array structure with the day (row) of each cell
+        columns: array structure with the portfolio (column) of each cell
+    outputs:
+        Array structure with the consecutive KO days of each cell
+    ---------------------------------------------------------------------------
+    """
+    periods = np.zeros(len(days), dtype=int)
+    active = np.arange(len(days))
+    lag = 0
+    while len(active):
+        day = days[active] - lag
+        ko = day >= 0
+        ko[ko] = ~flags[day[ko], columns[active][ko]]
+        active = active[ko]
+        periods[active] += 1
+        lag += 1
+    return periods
+
+        
+def backfill_kernel(values, rev_prod, rev_missing):
+    """Sequential kernel of series_reconstructor (compiled by the Numba 
+    backend, see kernel_backend): fills each missing value backwards from 
+    the next existing value of its series (anchor), dividing it by the 
+    reference index's factors of all sessions in between
+    ---------------------------------------------------------------------------
+    inputs:
+        values: 2-D array structure (sessions x series) with missing values
+        rev_prod: 2-D array structure with the reverse cumulative product 
+        of the reference index's factors for each series
+        rev_missing: 2-D array structure with the reverse cumulative count 
+        of the reference index's missing factors for each series
+    outputs:
+        2-D array structure with filled values (NaN where no value can be 
+        reconstructed)
+    ---------------------------------------------------------------------------
+    """
+    n, k = values.shape
+    filled = np.empty((n, k))
+    for j in range(k):
+        anchor = -1
+        for t in range(n - 1, -1, -1):
+            if not np.isnan(values[t, j]):
+                anchor = t
+                filled[t, j] = values[t, j]
+            elif anchor < 0 or rev_missing[t, j] > rev_missing[anchor, j]:
+                filled[t, j] = np.nan
+            else:
+                filled[t, j] = (values[anchor, j] * rev_prod[anchor, j] 
+                                / rev_prod[t, j])
+    return filled
+
+
+def ko_periods_kernel(ko):
+    """Sequential kernel of ko_period_calculator (compiled by the Numba 
+    backend): number of consecutive KO days up to each day
+    ---------------------------------------------------------------------------
+    inputs:
+        ko: 2-D boolean array structure (days x portfolios) with KO days
+    outputs:
+        2-D integer array structure with consecutive KO values
+    ---------------------------------------------------------------------------
+    """
+    n, k = ko.shape
+    periods = np.empty((n, k), dtype=np.int64)
+    for j in range(k):
+        run = 0
+        for t in range(n):
+            run = run + 1 if ko[t, j] else 0
+            periods[t, j] = run
+    return periods
+
+
+def ordered_update_kernel(ordered, old, new):
+    """Sequential kernel of ordered_window_update (compiled by the Numba 
+    backend): removes the value leaving each ordered window and inserts the
+    new value in its sorted position (binary searches)
+    ---------------------------------------------------------------------------
+    inputs:
+        ordered: 2-D array structure (portfolios x window) with each 
+        portfolio's window values in ascending order
+        old: array structure with the value leaving each window
+        new: array structure with the value entering each window
+    outputs:
+        2-D array structure with the updated ordered windows
+    ---------------------------------------------------------------------------
+    """
+    n, window = ordered.shape
+    updated = np.empty((n, window))
+    for i in range(n):
+        # position of the leaving value (number of lower values)
+        lo, hi = 0, window
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ordered[i, mid] < old[i]:
+                lo = mid + 1
+            else:
+                hi = mid
+        removed = lo
+        # insertion position of the new value among the remaining values
+        lo, hi = 0, window - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = ordered[i, mid + (mid >= removed)]
+            if value < new[i]:
+                lo = mid + 1
+            else:
+                hi = mid
+        inserted = lo
+        for p in range(window):
+            if p < inserted:
+                q = p
+            elif p == inserted:
+                updated[i, p] = new[i]
+                continue
+            else:
+                q = p - 1
+            updated[i, p] = ordered[i, q + (q >= removed)]
+    return updated
+
+
+def shared_chunk_worker(function, name, shape, index, columns, start, stop, 
+                        args, kwargs):
+    """Worker process task of parallel_calculator: applies the function to 
+    a chunk of portfolios of the P&L matrix stored in shared memory
+    ---------------------------------------------------------------------------
+    inputs:
+        function: function to be applied
+        name: name of the shared memory block with the P&L matrix
+        shape: shape of the P&L matrix (days x portfolios)
+        index: daily index of the P&L matrix
+        columns: portfolios of the chunk
+        start: position of the chunk's first portfolio
+        stop: position following the chunk's last portfolio
+        args: additional arguments for the function
+        kwargs: additional keyword arguments for the function
+    outputs:
+        Result of the function for the chunk of portfolios
+    ---------------------------------------------------------------------------
+    """
+    progress_bar.enabled = False
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        values = np.ndarray(shape, np.float64, shm.buf, order='F')
+        df = pd.DataFrame(
+                values[:, start : stop], index=index, columns=columns
+        )
+        with open(os.devnull, 'w') as devnull:
+            with contextlib.redirect_stdout(devnull):
+                result = function(df, *args, **kwargs)
+        del df, values
+    finally:
+        shm.close()
+    return result
+
+
+def combine_results(results):
+    """Combines the results obtained for chunks of portfolios
+    ---------------------------------------------------------------------------
+    inputs:
+        results: list of results (DataFrame structures, or tuples or 
+        dictionaries of DataFrame structures) for each chunk of portfolios
+    outputs:
+        Combined result for all portfolios
+    ---------------------------------------------------------------------------
+    """
+    first = results[0]
+    if isinstance(first, tuple):
+        return tuple(combine_results(list(r)) for r in zip(*results))
+    if isinstance(first, dict):
+        return {k: combine_results([r[k] for r in results]) for k in first}
+    return pd.concat(results, axis=1)
+
+
+### Classess ###
+
+
+class progress_bar(object):
+    """Object to provide visual aid to user, as a representation of current 
+    process status. The display is redrawn at most once per interval 
+    (seconds), and can be disabled entirely (e.g. for batch jobs) through 
+    progress_bar.enabled
+    """
+    default = 'Progress: %(bar)s %(percent)3d%%'
+    full = '%(bar)s %(current)d/%(total)d (%(percent)3d%%) %(remaining)d to go'
+    enabled = True
+    interval = 0.5
+    
+    def __init__(self, total, width=40, fmt=default, 
+                 symbol='=', output=None):
+        assert len(symbol) == 1
+        
+        self.total = total
+        self.width = width
+        self.symbol = symbol
+        self.output = output
+        self.fmt = re.sub(
+                r'(?P<name>%\(.+?\))d', r'\g<name>%dd' % len(str(total)), fmt
+        )
+        self.current = 0
+        self.last_draw = None
+        
+    def __call__(self):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if (self.last_draw is not None 
+                and now - self.last_draw < self.interval 
+                and self.current < self.total):
+            return
+        self.last_draw = now
+        percent = self.current / float(self.total)
+        size = int(self.width * percent)
+        remaining = self.total - self.current
+        bar = '[' + self.symbol*size + ' '*(self.width-size) + ']'
+        args = {'total':self.total,
+              'bar':bar,
+              'current':self.current,
+              'percent':percent*100,
+              'remaining': remaining
+        }
+        print( '\r' + self.fmt%args, file=self.output or sys.stderr, end='')
+    
+    def done(self):
+        self.current = self.total
+        if self.enabled:
+            self()
+            print('', file=self.output or sys.stderr)
+        
+class backtest_cube(object):
+    """Compact 3-D back-test structure (days x portfolios, for each metric),
+    storing P&L, VaR and ES values as floating point arrays, back-test 
+    results as boolean arrays and scenario labels as int8 codes of 
+    SCENARIOS (-1 for missing labels). VaR and ES of additional risk models
+    are stored as further metrics ('VaR - <model>', 'ES - <model>')
+    """
+    def __init__(self, index, portfolios, scenario, pl, var, es, 
+                 models=None):
+        self.index = index
+        self.portfolios = portfolios
+        self.scenario = scenario
+        self.pl = pl
+        self.values = {'VaR': var, 'ES': es}
+        for name, (m_var, m_es) in ({} if models is None 
+                                    else models).items():
+            self.values['VaR - ' + name] = m_var
+            self.values['ES - ' + name] = m_es
+        # back-test: 'True' if P&L value is superior to metric value (OK)
+        self.backtests = {m: v < pl for m, v in self.values.items()}
+        # arrays with spare days for appended days (see append)
+        self.buffers = None
+    
+    @property
+    def var(self):
+        return self.values['VaR']
+    
+    @property
+    def es(self):
+        return self.values['ES']
+    
+    @property
+    def var_backtest(self):
+        return self.backtests['VaR']
+    
+    @property
+    def es_backtest(self):
+        return self.backtests['ES']
+    
+    @property
+    def metrics(self):
+        return (['Scenario', 'P&L'] + list(self.values) 
+                + [m + ' - Back-test' for m in self.values])
+        
+    def __len__(self):
+        return len(self.index)
+    
+    def __getitem__(self, portfolio):
+        j = self.portfolios.get_loc(portfolio)
+        table = {'Scenario': pd.Categorical.from_codes(
+                         self.scenario[:, j], SCENARIOS
+                 ),
+                 'P&L': self.pl[:, j]
+        }
+        for m in self.values:
+            table[m] = self.values[m][:, j]
+        for m in self.backtests:
+            table[m + ' - Back-test'] = self.backtests[m][:, j]
+        return pd.DataFrame(table, index=self.index)
+    
+    def reserve(self, days):
+        # cube arrays become views of arrays with room for 'days' days, so 
+        # that appending a day does not copy the whole cube
+        n = len(self.index)
+        if self.buffers is None:
+            self.buffers = {'Scenario': self.scenario, 'P&L': self.pl}
+            for m in self.values:
+                self.buffers[m] = self.values[m]
+                self.buffers[m + ' - Back-test'] = self.backtests[m]
+        for name in self.buffers:
+            self.buffers[name] = reserve_rows(self.buffers[name], n, days)
+        self.scenario = self.buffers['Scenario'][: n]
+        self.pl = self.buffers['P&L'][: n]
+        for m in self.values:
+            self.values[m] = self.buffers[m][: n]
+            self.backtests[m] = self.buffers[m + ' - Back-test'][: n]
+    
+    def append(self, date, scenario, pl, values):
+        # spare days are reserved as in append_row (1/8 of the days, and at
+        # least 256 days)
+        n = len(self.index)
+        if self.buffers is None or len(self.buffers['P&L']) <= n:
+            self.reserve(n + max(n // 8, 256))
+        buffers = self.buffers
+        buffers['Scenario'][n] = scenario
+        buffers['P&L'][n] = pl
+        for m in self.values:
+            buffers[m][n] = values[m]
+            buffers[m + ' - Back-test'][n] = buffers[m][n] < buffers['P&L'][n]
+        self.index = self.index.append(pd.Index([date]))
+        # views including the new day
+        self.reserve(n + 1)
+    
+    def __getstate__(self):
+        # spare days are not pickled (e.g. by the stage cache)
+        return dict(self.__dict__, buffers=None)
+    
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in [self.scenario, self.pl] 
+                   + list(self.values.values()) 
+                   + list(self.backtests.values()))
+        
+    def to_frame(self):
+        return pd.concat(
+                [self[p] for p in self.portfolios], 
+                axis=1, 
+                keys=self.portfolios
+        )
+    
+    @classmethod
+    def from_frame(cls, frame):
+        portfolios = frame.columns.get_level_values(0).unique()
+        table = lambda m: frame.xs(m, axis=1, level=1)[portfolios]
+        scenario = np.stack(
+                [pd.Categorical(table('Scenario')[p], 
+                                categories=SCENARIOS).codes 
+                 for p in portfolios], 
+                axis=1
+        ).astype(np.int8)
+        models = [m[len('VaR - ') :] 
+                  for m in frame.columns.get_level_values(1).unique()
+                  if m.startswith('VaR - ') 
+                  and not m.endswith(' - Back-test')]
+        values = lambda m: table(m).values.astype(float)
+        return cls(frame.index, portfolios, scenario, values('P&L'), 
+                   values('VaR'), values('ES'), 
+                   {name: (values('VaR - ' + name), values('ES - ' + name))
+                    for name in models})
+
+
+class risk_state(object):
+    """Incremental (daily update) state of the VaR / ES back-test pipeline 
+    for a set of portfolios: ordered rolling windows of P&L and of P&L 
+    standardized by EWMA volatility, EWMA variance, running cumulative 
+    sums, historic window returns (scenario thresholds), back-test cube 
+    (historic, filtered historic and EWMA VaR and ES, as in run) and KPI 
+    aggregates (including KO run counters). Appending a day produces the 
+    same results, bit by bit, as a full recalculation of the extended 
+    history; the state (with the portfolios' weights, if provided) can be 
+    saved to and loaded from disk
+    """
+    def __init__(self, df, window=500, confidence=0.99, decay=0.94, 
+                 weights=None):
+        self.window = window
+        self.confidence = confidence
+        self.decay = decay
+        self.weights = weights
+        self.rank = window - 1 - round(window*confidence)
+        # full calculation of the historic pipeline
+        means = window_means(df, window).dropna()
+        thresholds = scenario_thresholds(means)
+        labels = scenario_labeler(means, *thresholds)
+        var, es = var_es_calculator(df, window, confidence)
+        models = {'FHS': fhs_calculator(df, window, confidence, decay),
+                  'EWMA': ewma_calculator(df, window, confidence, decay)}
+        self.means = np.ascontiguousarray(means.values, dtype=float)
+        self.thresholds = np.stack([t.values for t in thresholds])
+        self.cube = backtester(labels, df, var, es, models=models)
+        self.aggregates = backtest_aggregates(
+                self.cube.scenario, self.cube.pl, self.cube.values
+        )
+        # number of days of each scenario (scenarios x portfolios)
+        self.counts = np.stack([(self.cube.scenario == i).sum(axis=0) 
+                                for i in range(len(SCENARIOS))])
+        # rolling window state: last 'window' days of P&L and standardized 
+        # P&L (ring buffers, oldest day at 'head'), same days sorted for 
+        # each portfolio, EWMA variance forecast of the next day, and 
+        # cumulative sums at both ends of the window (ring buffer, oldest at
+        # 'cs_head')
+        values = df.values.astype(float)
+        variance = ewma_variance(values, window, decay)
+        standardized = values / np.sqrt(variance[: -1])
+        self.variance = variance[-1]
+        self.recent = values[-window :].copy()
+        self.recent_std = standardized[-window :].copy()
+        self.head = 0
+        self.ordered = np.sort(self.recent.T, axis=1)
+        self.ordered_std = np.sort(self.recent_std.T, axis=1)
+        self.cumsum = np.cumsum(values, axis=0)[-window-1 :].copy()
+        if len(values) == window:
+            self.cumsum = np.concatenate(
+                    [np.zeros((1, values.shape[1])), self.cumsum]
+            )
+        self.cs_head = 0
+    
+    def tail(self, ordered):
+        # VaR and ES of ordered windows (same calculation as 
+        # window_order_statistics)
+        var = ordered[:, self.rank].copy()
+        if self.rank > 0:
+            es = np.sort(ordered[:, : self.rank], axis=-1).mean(axis=-1)
+        else:
+            es = np.full(len(ordered), np.nan)
+        return var, es
+        
+    def update(self, date, pl):
+        """Appends a day's P&L (array or Series structure, for each 
+        portfolio) to the state, updating the back-test cube and aggregates
+        """
+        if isinstance(pl, pd.Series):
+            pl = pl[self.cube.portfolios].values
+        x = np.asarray(pl, dtype=float)
+        window = self.window
+        portfolios = self.cube.portfolios
+        n = len(self.cube)
+        
+        # VaR and ES of the window preceding the day: historic, filtered 
+        # historic (standardized window rescaled by the day's volatility) 
+        # and EWMA parametric (same calculations as the models' calculators)
+        sigma = np.sqrt(self.variance)
+        var, es = self.tail(self.ordered)
+        fhs_var, fhs_es = self.tail(self.ordered_std)
+        z = statistics.NormalDist().inv_cdf(1 - self.confidence)
+        values = {
+                'VaR': var, 
+                'ES': es, 
+                'VaR - FHS': fhs_var * sigma, 
+                'ES - FHS': fhs_es * sigma,
+                'VaR - EWMA': sigma * z,
+                'ES - EWMA': -sigma * statistics.NormalDist().pdf(z) / (
+                        1 - self.confidence
+                )
+        }
+        
+        # average return of the window preceding the day, and thresholds 
+        # over the whole history (thresholds move every day)
+        newest = self.cumsum[(self.cs_head - 1) % (window + 1)]
+        mean = (newest - self.cumsum[self.cs_head]) / window
+        self.means = append_row(self.means, n, mean)
+        thresholds = np.stack(scenario_thresholds(self.means[: n + 1]))
+        
+        # past labels can only change for window returns between previous
+        # and new thresholds
+        low = np.minimum(self.thresholds, thresholds)
+        high = np.maximum(self.thresholds, thresholds)
+        candidates = np.isnan(low).any(axis=0) | np.isnan(high).any(axis=0)
+        candidates = np.broadcast_to(candidates, (n, len(x))).copy()
+        past = self.means[: n]
+        for l, h in zip(low, high):
+            candidates |= (past >= l) & (past <= h)
+        days, columns = np.nonzero(candidates)
+        codes = scenario_codes(past[days, columns], 
+                               *thresholds[:, columns])
+        changed = codes != self.cube.scenario[days, columns]
+        self.relabel(days[changed], columns[changed], codes[changed])
+        self.thresholds = thresholds
+        code = scenario_codes(mean, *thresholds)
+        self.cube.append(date, code, x, values)
+        observed = code >= 0
+        self.counts[np.maximum(code, 0), np.arange(len(x))] += observed
+        
+        # update aggregates with the day's back-test results
+        complete = (code >= 0) & ~np.isnan(x)
+        for metric_values in values.values():
+            complete &= ~np.isnan(metric_values)
+        cells = (np.maximum(code, 0), np.arange(len(x)))
+        for metric, metric_values in values.items():
+            flags = metric_values < x
+            ko = ~flags & complete
+            run = np.where(flags, 0, self.aggregates['Run', metric] + 1)
+            self.aggregates['Run', metric] = run
+            kos = self.aggregates['KOs', metric]
+            excess = self.aggregates['Excess', metric]
+            period = self.aggregates['Period', metric]
+            kos[cells] += ko & observed
+            excess[cells] = np.where(
+                    ko & observed, 
+                    np.minimum(excess[cells], x - metric_values), 
+                    excess[cells]
+            )
+            period[cells] = np.where(
+                    observed, np.maximum(period[cells], run), period[cells]
+            )
+        
+        # slide the rolling window state
+        old = self.recent[self.head].copy()
+        old_std = self.recent_std[self.head].copy()
+        standardized = x / sigma
+        self.recent[self.head] = x
+        self.recent_std[self.head] = standardized
+        self.head = (self.head + 1) % window
+        self.ordered = ordered_window_update(self.ordered, old, x)
+        self.ordered_std = ordered_window_update(
+                self.ordered_std, old_std, standardized
+        )
+        self.variance = ewma_step(self.variance, x**2, self.decay)
+        self.cumsum[self.cs_head] = newest + x
+        self.cs_head = (self.cs_head + 1) % (window + 1)
+        
+    def relabel(self, days, columns, codes):
+        """Relabels past days (cells of the back-test cube) with new 
+        scenario codes, moving their back-test results from the aggregates
+        of the scenarios they leave to those of the scenarios they enter. 
+        Portfolios whose maximum excess loss or KO period could decrease 
+        (or with missing labels) are aggregated again
+        """
+        cube = self.cube
+        old = cube.scenario[days, columns]
+        cube.scenario[days, columns] = codes
+        again = np.zeros(len(cube.portfolios), dtype=bool)
+        again[columns[(old < 0) | (codes < 0)]] = True
+        keep = ~again[columns]
+        days, columns, old, codes = (days[keep], columns[keep], old[keep], 
+                                     codes[keep])
+        np.subtract.at(self.counts, (old, columns), 1)
+        np.add.at(self.counts, (codes, columns), 1)
+        
+        pl = cube.pl[days, columns]
+        complete = ~np.isnan(pl)
+        for metric_values in cube.values.values():
+            complete &= ~np.isnan(metric_values[days, columns])
+        for metric, metric_values in cube.values.items():
+            flags = cube.backtests[metric]
+            ko = ~flags[days, columns] & complete
+            excess = pl - metric_values[days, columns]
+            run = ko_periods_at(flags, days, columns)
+            kos = self.aggregates['KOs', metric]
+            min_excess = self.aggregates['Excess', metric]
+            period = self.aggregates['Period', metric]
+            # scenarios left: extremes reached by a day leaving them are 
+            # calculated again
+            again[columns[ko & (excess <= min_excess[old, columns])]] = True
+            again[columns[(run > 0) & (run >= period[old, columns])]] = True
+            np.subtract.at(kos, (old, columns), ko)
+            # scenarios entered
+            np.add.at(kos, (codes, columns), ko)
+            np.minimum.at(min_excess, (codes, columns), 
+                          np.where(ko, excess, np.inf))
+            np.maximum.at(period, (codes, columns), run)
+            # scenarios no longer observed
+            period[self.counts == 0] = -1
+            
+        if again.any():
+            partial = backtest_aggregates(
+                    cube.scenario[:, again], 
+                    cube.pl[:, again],
+                    {m: v[:, again] for m, v in cube.values.items()}
+            )
+            for key in partial:
+                self.aggregates[key][..., again] = partial[key]
+        
+    def summary(self):
+        return summary_matrix(
+                self.aggregates, len(self.cube), self.cube.portfolios
+        )
+    
+    def save(self, path):
+        arrays = {
+                'window': self.window,
+                'confidence': self.confidence,
+                'decay': self.decay,
+                'head': self.head,
+                'cs_head': self.cs_head,
+                'recent': self.recent,
+                'recent_std': self.recent_std,
+                'ordered': self.ordered,
+                'ordered_std': self.ordered_std,
+                'variance': self.variance,
+                'cumsum': self.cumsum,
+                'means': self.means[: len(self.cube)],
+                'thresholds': self.thresholds,
+                'counts': self.counts,
+                'index': np.asarray(self.cube.index),
+                'portfolios': np.asarray(self.cube.portfolios, dtype=str),
+                'metrics': np.asarray(list(self.cube.values), dtype=str),
+                'scenario': self.cube.scenario,
+                'pl': self.cube.pl
+        }
+        for metric, values in self.cube.values.items():
+            arrays['values - ' + metric] = values
+        for (name, metric), array in self.aggregates.items():
+            arrays[name + ' - ' + metric] = array
+        if self.weights is not None:
+            arrays['weights'] = self.weights.values
+            arrays['securities'] = np.asarray(self.weights.columns, 
+                                              dtype=str)
+        # write to a temporary file and replace, so that an interrupted 
+        # update never leaves a corrupted state
+        with open(path + '.tmp', 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(path + '.tmp', path)
+    
+    @classmethod
+    def load(cls, path):
+        state = cls.__new__(cls)
+        with np.load(path) as archive:
+            state.window = int(archive['window'])
+            state.confidence = float(archive['confidence'])
+            state.decay = float(archive['decay'])
+            state.rank = (state.window - 1 
+                          - round(state.window*state.confidence))
+            state.head = int(archive['head'])
+            state.cs_head = int(archive['cs_head'])
+            for name in ['recent', 'recent_std', 'ordered', 'ordered_std', 
+                         'variance', 'cumsum', 'thresholds', 'counts']:
+                setattr(state, name, archive[name])
+            portfolios = pd.Index(archive['portfolios'].tolist())
+            metrics = archive['metrics'].tolist()
+            values = {m: archive['values - ' + m] for m in metrics}
+            state.cube = backtest_cube(
+                    pd.Index(archive['index']), 
+                    portfolios,
+                    archive['scenario'],
+                    archive['pl'],
+                    values['VaR'],
+                    values['ES'],
+                    {m[len('VaR - ') :]: (values[m], 
+                                          values['ES' + m[len('VaR') :]])
+                     for m in metrics if m.startswith('VaR - ')}
+            )
+            state.aggregates = {
+                    (name, metric): archive[name + ' - ' + metric]
+                    for name in ['KOs', 'Excess', 'Period', 'Run']
+                    for metric in metrics
+            }
+            # room for the days of the next updates (see append_row)
+            n = len(state.cube)
+            state.cube.reserve(n + 256)
+            state.means = reserve_rows(archive['means'], n, n + 256)
+            state.weights = None
+            if 'weights' in archive.files:
+                state.weights = pd.DataFrame(
+                        archive['weights'], 
+                        index=portfolios, 
+                        columns=archive['securities'].tolist()
+                )
+        return state
+
+
+class market_data_missing(KeyError):
+    """Exception raised for tickers that are not available in the market 
+    data cache (offline mode) or in a local market data source, which 
+    retrying cannot fix (see retry_call)
+    """
+
+
+class index_data_missing(market_data_missing):
+    """Exception raised when the index's market data cannot be loaded, 
+    which the analysis requires (see run)
+    """
+
+
+class csv_source(object):
+    """Local stand-in market data source, reading each ticker's series from 
+    a CSV file (<ticker>.csv, with 'Date' and 'Adj Close' columns) in the 
+    provided directory, so that the pipeline can run without network access
+    """
+    def __init__(self, directory, column='Adj Close'):
+        self.directory = directory
+        self.column = column
+        
+    def tickers(self):
+        return sorted(
+                f[: -len('.csv')] for f in os.listdir(self.directory) 
+                if f.endswith('.csv')
+        )
+    
+    def __call__(self, ticker, start, end):
+        path = os.path.join(self.directory, ticker + '.csv')
+        if not os.path.exists(path):
+            raise market_data_missing(
+                    '{0} is not available in {1}'.format(ticker, path)
+            )
+        df = pd.read_csv(path, index_col=0, parse_dates=True, 
+                         float_precision='round_trip')
+        return df[self.column].sort_index().loc[start : end]
+
+
+class price_store(object):
+    """Persistent on-disk cache of market data, with one NumPy archive per 
+    ticker (session dates, Adjusted Close values and the date range already 
+    covered by the source, up to the last session it returned). Only the 
+    date ranges missing from the cache are requested from the source; in 
+    offline mode, only the cache is read
+    """
+    day = pd.Timedelta(days=1)
+    
+    def __init__(self, directory, source=None, offline=False):
+        self.directory = directory
+        self.source = yahoo_source if source is None else source
+        self.offline = offline
+        os.makedirs(directory, exist_ok=True)
+        
+    def path(self, ticker):
+        return os.path.join(
+                self.directory, ticker.replace(os.sep, '_') + '.npz'
+        )
+    
+    def tickers(self):
+        return sorted(
+                f[: -len('.npz')] for f in os.listdir(self.directory) 
+                if f.endswith('.npz')
+        )
+        
+    def read(self, ticker):
+        try:
+            with np.load(self.path(ticker)) as archive:
+                series = pd.Series(
+                        archive['values'], 
+                        index=pd.to_datetime(archive['dates']), 
+                        name=ticker
+                )
+                covered = (pd.Timestamp(archive['start'].item()), 
+                           pd.Timestamp(archive['end'].item()))
+        except FileNotFoundError:
+            return None, None
+        return series, covered
+    
+    def write(self, ticker, series, covered):
+        # write to a temporary file and replace, so that an interrupted run 
+        # never leaves a corrupted archive in the cache
+        tmp_path = self.path(ticker) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                    f,
+                    dates=series.index.values.astype('datetime64[ns]'),
+                    values=series.values.astype(float),
+                    start=np.datetime64(covered[0], 'ns'),
+                    end=np.datetime64(covered[1], 'ns')
+            )
+        os.replace(tmp_path, self.path(ticker))
+        
+    def load(self, ticker, start, end, source=None):
+        start = pd.Timestamp(start)
+        end = pd.Timestamp(end)
+        series, covered = self.read(ticker)
+        if self.offline:
+            if series is None:
+                raise market_data_missing(
+                        '{0} is not available in the market data cache'
+                        .format(ticker)
+                )
+            return series.loc[start : end]
+        
+        # identify date ranges not yet requested from the source
+        if series is None:
+            missing = [(start, end)]
+            parts = []
+            covered = (start, end)
+        else:
+            missing = []
+            if start < covered[0]:
+                missing.append((start, covered[0] - self.day))
+            if end > covered[1]:
+                missing.append((covered[1] + self.day, end))
+            parts = [series]
+            covered = (min(start, covered[0]), max(end, covered[1]))
+        
+        if missing:
+            source = self.source if source is None else source
+            for s, e in missing:
+                parts.append(source(ticker, s, e))
+            series = pd.concat(parts).sort_index()
+            series = series[~series.index.duplicated(keep='last')]
+            series.name = ticker
+            # covered up to the last session returned, so that sessions not 
+            # yet published are requested again by later loads
+            last = series.index[-1] if len(series) else covered[0] - self.day
+            covered = (covered[0], min(covered[1], last))
+            self.write(ticker, series, covered)
+        return series.loc[start : end]
+
+
+class stage_cache(object):
+    """Size-bounded on-disk cache of stage results (see stage_node), with 
+    one pickle file per content hash. Files are touched on every read, and 
+    the least recently used files are evicted once the cache exceeds its 
+    maximum size
+    """
+    def __init__(self, directory, max_bytes=2**30):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        
+    def path(self, key):
+        return os.path.join(self.directory, key + '.pkl')
+    
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+    
+    def get(self, key):
+        with open(self.path(key), 'rb') as f:
+            value = pickle.load(f)
+        os.utime(self.path(key))
+        return value
+    
+    def put(self, key, value):
+        # write to a temporary file and replace, so that an interrupted run 
+        # never leaves a corrupted result in the cache
+        tmp_path = self.path(key) + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+        
+    def evict(self):
+        files = []
+        for f in os.listdir(self.directory):
+            if f.endswith('.pkl'):
+                stat = os.stat(os.path.join(self.directory, f))
+                files.append((stat.st_mtime, stat.st_size, f))
+        total = sum(size for _, size, _ in files)
+        for _, size, f in sorted(files):
+            if total <= self.max_bytes:
+                break
+            os.remove(os.path.join(self.directory, f))
+            total -= size
+    
+    @property
+    def nbytes(self):
+        return sum(os.path.getsize(os.path.join(self.directory, f)) 
+                   for f in os.listdir(self.directory) if f.endswith('.pkl'))
+
+
+class stage_node(object):
+    """Lazy node of the pipeline's stage graph: a function applied to inputs
+    (values or other nodes, also within lists, tuples and dictionaries) and 
+    parameters. Each node is identified by a content hash of its function, 
+    inputs and parameters (upstream nodes by their own hash), so that its 
+    result is only calculated (and upstream results only loaded) if it is 
+    not available in the stage cache. Parameters that do not affect the 
+    result (e.g. workers) are passed as untracked, and stages of functions 
+    that are not instrumented themselves can be recorded in the run monitor
+    under a name. Stage functions are assumed to be deterministic given 
+    their inputs and parameters
+    """
+    def __init__(self, function, *args, name=None, untracked=None, 
+                 persist=True, **kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.name = function.__name__ if name is None else name
+        self.monitored = name is not None
+        self.untracked = {} if untracked is None else untracked
+        self.persist = persist
+        self._key = None
+        self._value = None
+        self._done = False
+        
+    @property
+    def key(self):
+        if self._key is None:
+            self._key = content_hash(
+                    (self.function, self.args, self.kwargs)
+            )
+        return self._key
+    
+    def __getitem__(self, item):
+        # element of a stage's result (e.g. VaR of a (VaR, ES) tuple), 
+        # not persisted separately
+        return stage_node(operator.getitem, self, item, persist=False)
+    
+    def result(self, cache=None):
+        if self._done:
+            return self._value
+        if self.persist and cache is not None and self.key in cache:
+            print()
+            print('Loading cached results of {0}'.format(self.name))
+            self._value = cache.get(self.key)
+        else:
+            resolve = lambda v: stage_node.resolve(v, cache)
+            args = [resolve(a) for a in self.args]
+            kwargs = {k: resolve(v) for k, v in self.kwargs.items()}
+            kwargs.update(self.untracked)
+            if self.monitored:
+                rows = next((len(a) for a in args 
+                             if isinstance(a, (pd.DataFrame, np.ndarray))), 
+                            None)
+                with monitor.stage(self.name, rows):
+                    self._value = self.function(*args, **kwargs)
+            else:
+                self._value = self.function(*args, **kwargs)
+            if self.persist and cache is not None:
+                cache.put(self.key, self._value)
+        self._done = True
+        return self._value
+    
+    @staticmethod
+    def resolve(value, cache=None):
+        if isinstance(value, stage_node):
+            return value.result(cache)
+        if isinstance(value, (list, tuple)):
+            return type(value)(stage_node.resolve(v, cache) for v in value)
+        if isinstance(value, dict):
+            return {k: stage_node.resolve(v, cache) for k, v in value.items()}
+        return value
+
+
+class kernel_backend(object):
+    """Backend of the sequential kernels (backward fill of 
+    series_reconstructor, KO streaks of ko_period_calculator and ordered 
+    window updates of risk_state): 'numba' compiles the kernels' loops 
+    (cached on disk, so that they are only compiled once), 'numpy' uses the
+    vectorized NumPy implementations, and 'auto' selects Numba if it is 
+    installed. Numba is only imported when a kernel is first used
+    """
+    names = ['auto', 'numba', 'numpy']
+    loops = {'backfill': backfill_kernel, 
+             'ko_periods': ko_periods_kernel,
+             'ordered_update': ordered_update_kernel}
+    
+    def __init__(self, name='auto'):
+        self.select(name)
+        
+    def select(self, name='auto'):
+        if name not in self.names:
+            raise ValueError('Unknown kernel backend: {0}'.format(name))
+        self.requested = name
+        self.name = None
+        self.compiled = {}
+        
+    def resolve(self):
+        if self.name is None:
+            self.name = 'numpy'
+            if self.requested != 'numpy':
+                try:
+                    import numba
+                    self.numba = numba
+                    self.name = 'numba'
+                except ImportError:
+                    if self.requested == 'numba':
+                        raise
+        return self.name
+    
+    def get(self, kernel):
+        if self.resolve() == 'numpy':
+            return None
+        if kernel not in self.compiled:
+            self.compiled[kernel] = self.numba.njit(cache=True, nogil=True)(
+                    self.loops[kernel]
+            )
+        return self.compiled[kernel]
+
+
+# kernel backend of the current process
+kernels = kernel_backend()
+
+
+class result_store(object):
+    """Persistent, indexed store of back-test results for low-latency 
+    queries: daily scenario codes, P&L and risk metric values are stored as
+    column-major NumPy arrays (one file each, read as memory-mapped arrays,
+    so that the days of a portfolio are contiguous), with a date index and 
+    a portfolio index; KPI summary and regulatory back-test statistics are 
+    stored along with their labels
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        
+    def path(self, name):
+        return os.path.join(self.directory, name)
+    
+    def key(self):
+        try:
+            with open(self.path('meta.json')) as f:
+                return json.load(f).get('key')
+        except (FileNotFoundError, ValueError):
+            return None
+        
+    def save(self, cube, summary, tests=None, key=None):
+        os.makedirs(self.directory, exist_ok=True)
+        arrays = {'dates': cube.index.values.astype('datetime64[ns]'),
+                  'scenario': cube.scenario,
+                  'pl': cube.pl,
+                  'summary': summary.values}
+        files = {}
+        for i, metric in enumerate(cube.values):
+            files[metric] = 'metric_{0}'.format(i)
+            arrays[files[metric]] = cube.values[metric]
+        if tests is not None:
+            arrays['tests'] = tests.values
+        # arrays written to temporary files and replaced, and index written
+        # last, so that a reader never finds an incomplete store
+        for name, values in arrays.items():
+            tmp_path = self.path(name + '.tmp.npy')
+            np.save(tmp_path, np.asfortranarray(values))
+            os.replace(tmp_path, self.path(name + '.npy'))
+        meta = {'key': key,
+                'portfolios': [str(p) for p in cube.portfolios],
+                'metrics': files,
+                'summary': [list(summary.index), 
+                            [list(map(str, c)) for c in summary.columns]],
+                'tests': None if tests is None else [
+                        list(tests.index), 
+                        [list(map(str, c)) for c in tests.columns]
+                ]}
+        with open(self.path('meta.json.tmp'), 'w') as f:
+            json.dump(meta, f)
+        os.replace(self.path('meta.json.tmp'), self.path('meta.json'))
+        
+    def open(self):
+        with open(self.path('meta.json')) as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(self.path(name + '.npy'), mmap_mode='r')
+        self.dates = np.asarray(load('dates'))
+        self.portfolios = {p: j for j, p in enumerate(self.meta['portfolios'])}
+        self.scenario = load('scenario')
+        self.pl = load('pl')
+        self.values = {m: load(f) for m, f in self.meta['metrics'].items()}
+        self.tables = {t: load(t) for t in ('summary', 'tests') 
+                       if self.meta[t] is not None}
+        return self
+    
+    def day(self, date):
+        return np.datetime64(pd.Timestamp(date), 'ns')
+    
+    def days(self):
+        return [str(d) for d in self.dates[[0, -1]].astype('datetime64[D]')
+                ] if len(self.dates) else [None, None]
+    
+    def query(self, portfolio, start=None, end=None):
+        j = self.portfolios[portfolio]
+        lo = (0 if start is None 
+              else np.searchsorted(self.dates, self.day(start), 'left'))
+        hi = (len(self.dates) if end is None 
+              else np.searchsorted(self.dates, self.day(end), 'right'))
+        pl = np.asarray(self.pl[lo : hi, j])
+        codes = np.asarray(self.scenario[lo : hi, j])
+        result = {'portfolio': portfolio,
+                  'dates': [str(d) for d in 
+                            self.dates[lo : hi].astype('datetime64[D]')],
+                  'Scenario': [SCENARIOS[c] if c >= 0 else None 
+                               for c in codes],
+                  'P&L': json_values(pl)}
+        for metric, values in self.values.items():
+            values = np.asarray(values[lo : hi, j])
+            result[metric] = json_values(values)
+            # KO: P&L value not superior to metric value
+            result[metric + ' - KO'] = (~(values < pl)).tolist()
+        return result
+    
+    def table(self, name, portfolio):
+        rows, columns = self.meta[name]
+        positions = [i for i, c in enumerate(columns) if c[0] == portfolio]
+        if not positions:
+            raise KeyError(portfolio)
+        values = np.asarray(self.tables[name][:, positions])
+        return {row: dict(zip([columns[i][1] for i in positions], 
+                              json_values(values[r])))
+                for r, row in enumerate(rows)}
+
+
+class local_query_client(object):
+    """In-process stand-in of the query service (see query_service): 
+    answers the same requests, with the same status codes and JSON 
+    documents, without a server (e.g. for tests and notebooks)
+    """
+    def __init__(self, store):
+        self.store = store
+    
+    def get(self, target):
+        url = urllib.parse.urlsplit(target)
+        params = {k: v[-1] 
+                  for k, v in urllib.parse.parse_qs(url.query).items()}
+        if url.path in ('/risk', '/summary') and 'portfolio' not in params:
+            return 400, {'error': 'Missing portfolio parameter'}
+        try:
+            if url.path == '/portfolios':
+                first_day, last_day = self.store.days()
+                return 200, {'portfolios': list(self.store.portfolios),
+                             'first_day': first_day,
+                             'last_day': last_day}
+            if url.path == '/risk':
+                if 'date' in params:
+                    start = end = params['date']
+                else:
+                    start, end = params.get('start'), params.get('end')
+                return 200, self.store.query(params['portfolio'], start, end)
+            if url.path == '/summary':
+                p = params['portfolio']
+                result = {'portfolio': p, 
+                          'summary': self.store.table('summary', p)}
+                if 'tests' in self.store.tables:
+                    result['tests'] = self.store.table('tests', p)
+                return 200, result
+        except KeyError as e:
+            return 404, {'error': 'Unknown {0}'.format(e.args[0])}
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        return 404, {'error': 'Unknown path {0}'.format(url.path)}
+
+
+####################################
+#             MAIN CODE
+####################################
+
+if __name__ == "__main__":
+    main()